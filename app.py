@@ -3,20 +3,45 @@ import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+from scipy import sparse
 from fpdf import FPDF
 import gspread
-#from googletrans import Translator
 from oauth2client.service_account import ServiceAccountCredentials
 import base64
+import csv
+import html
 import time
 import os
 import re
+import shutil
+import sys
+import tempfile
+import hashlib
+import json
+import tracemalloc
+import threading
+import uuid
+import warnings
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from io import StringIO
-
-# Function to connect to Google Sheets
-def connect_to_google_sheet(sheet_name):
+from io import BytesIO, StringIO
+
+# Static chart export for the PDF report is optional; without kaleido the report falls back to text only
+try:
+    import kaleido
+    CHART_EXPORT_AVAILABLE = True
+except ImportError:
+    CHART_EXPORT_AVAILABLE = False
+
+# Google Sheets client, authorized once per process and shared by the feedback form and the Sheet data source
+@st.cache_resource
+def google_sheets_client():
     # Define the scope
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
@@ -36,16 +61,944 @@ def connect_to_google_sheet(sheet_name):
 
     # Authorize the client
     creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
+    return gspread.authorize(creds)
 
+# Function to connect to Google Sheets
+def connect_to_google_sheet(sheet_name):
     # Open the Google Sheet
-    sheet = client.open(sheet_name).sheet1
+    sheet = google_sheets_client().open(sheet_name).sheet1
     return sheet
 
+# Form responses read straight from a Sheet. Works with any worksheet-like object that has row_count, row_values(1)
+# and batch_get(ranges) (a gspread Worksheet, or a local fake), and remembers the last synced row so a refresh only
+# fetches the rows added since. Rows are read in SHEET_BATCH_ROWS blocks, SHEET_RANGES_PER_CALL blocks per request.
+SHEET_BATCH_ROWS = 5_000
+SHEET_RANGES_PER_CALL = 10
+
+class SheetUpload(BytesIO):
+    # Quacks like st.file_uploader's UploadedFile, so the rest of the pipeline does not know the data came from a Sheet
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+class SheetResponseSource:
+    def __init__(self, worksheet, name):
+        self.worksheet = worksheet
+        self.name = name
+        self.header = None
+        self.rows = []
+        self.last_synced_row = 1  # the header row
+        self.synced_at = None
+        self.csv_bytes = b""
+        self.lock = threading.Lock()
+
+    def _fetch(self, first_row, last_row, n_cols):
+        starts = list(range(first_row, last_row + 1, SHEET_BATCH_ROWS))
+        ranges = [
+            f"{gspread.utils.rowcol_to_a1(start, 1)}:{gspread.utils.rowcol_to_a1(min(start + SHEET_BATCH_ROWS - 1, last_row), n_cols)}"
+            for start in starts
+        ]
+        blocks = []
+        for i in range(0, len(ranges), SHEET_RANGES_PER_CALL):
+            blocks.extend([list(value_range) for value_range in self.worksheet.batch_get(ranges[i:i + SHEET_RANGES_PER_CALL])])
+        # The API leaves out trailing empty rows of each range: pad every block before the last non-empty one
+        while blocks and not blocks[-1]:
+            blocks.pop()
+        rows = []
+        for block in blocks[:-1]:
+            rows.extend(block + [[] for _ in range(SHEET_BATCH_ROWS - len(block))])
+        if blocks:
+            rows.extend(blocks[-1])
+        return rows
+
+    # Returns the number of new rows
+    def sync(self):
+        with self.lock:
+            header = self.worksheet.row_values(1)
+            if header != self.header:  # new or edited questions: start over
+                self.header = header
+                self.rows = []
+                self.last_synced_row = 1
+            new_rows = []
+            if header and self.worksheet.row_count > self.last_synced_row:
+                new_rows = self._fetch(self.last_synced_row + 1, self.worksheet.row_count, len(header))
+            self.rows.extend(new_rows)
+            self.last_synced_row += len(new_rows)
+            self.synced_at = datetime.now()
+            if new_rows or not self.csv_bytes:
+                buffer = StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(self.header)
+                writer.writerows(self.rows)
+                self.csv_bytes = buffer.getvalue().encode("utf-8")
+            return len(new_rows)
+
+    # A fresh file object per script run (the parser reads it to the end)
+    def as_upload(self):
+        return SheetUpload(self.csv_bytes, f"{self.name}.csv")
+
+@st.cache_resource
+def sheet_response_source(sheet_name):
+    return SheetResponseSource(connect_to_google_sheet(sheet_name), sheet_name)
+
+# The service account can open every Sheet shared with it (the feedback Sheet, other schools' responses), so
+# visitors only choose among the Sheets this deployment lists in the [response_sheets] secrets table, as
+# "Label shown in the app" = "Google Sheet name"
+def allowed_response_sheets():
+    try:
+        return dict(st.secrets.get("response_sheets", {}))
+    except FileNotFoundError:
+        return {}
+
 # Initialize session state for navigation
 if 'current_page' not in st.session_state:
     st.session_state['current_page'] = 'landing'
 
+# Performance instrumentation: each pipeline stage records wall time, CPU time, rows and peak memory.
+# Records are kept per session and, if APNAPAN_PERF_LOG is set, appended to a JSON-lines file shared by all sessions.
+PERF_LOG_PATH = os.environ.get("APNAPAN_PERF_LOG")
+PERF_MAX_RECORDS = 500
+
+if 'session_id' not in st.session_state:
+    st.session_state['session_id'] = uuid.uuid4().hex[:12]
+if 'perf_records' not in st.session_state:
+    st.session_state['perf_records'] = deque(maxlen=PERF_MAX_RECORDS)
+st.session_state['perf_run'] = st.session_state.get('perf_run', 0) + 1
+
+# Admin panel (and memory tracing, which has a real cost) is only enabled with ?admin=1 in the URL
+admin_mode = st.query_params.get("admin") == "1"
+
+@contextmanager
+def perf_stage(stage, rows=None):
+    record = {
+        "session": st.session_state['session_id'],
+        "run": st.session_state['perf_run'],
+        "dataset": st.session_state.get('dataset_fingerprint'),
+        "stage": stage,
+        "rows": rows,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    # tracemalloc is process-wide, so skip memory if another stage/session is already tracing
+    trace_memory = admin_mode and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_ms"] = round((time.perf_counter() - wall_start) * 1000, 2)
+        record["cpu_ms"] = round((time.process_time() - cpu_start) * 1000, 2)
+        record["peak_mem_mb"] = None
+        if trace_memory:
+            record["peak_mem_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+            tracemalloc.stop()
+        record_perf(record)
+
+def record_perf(record):
+    st.session_state['perf_records'].append(record)
+    if PERF_LOG_PATH:
+        try:
+            with open(PERF_LOG_PATH, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing performance log: {e}")
+
+# Shared worker pool for heavy stages (full-file cleaning, group aggregation, PDF generation).
+# Job functions take the job as first argument and call job.report(fraction), which raises JobCancelled once cancelled.
+WORKER_POOL_SIZE = 4
+MAX_JOBS_PER_SESSION = 2
+BACKGROUND_MIN_ROWS = 50_000
+JOB_RETENTION_SECONDS = 30 * 60
+
+class JobCancelled(Exception):
+    pass
+
+class BackgroundJob:
+    def __init__(self, key, name, session_id, dataset, rows=None):
+        self.key = key
+        self.name = name
+        self.session_id = session_id
+        self.dataset = dataset
+        self.rows = rows
+        self.status = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.partial = None
+        self.error = None
+        self.wall_ms = None
+        self.cpu_ms = None
+        self.logged = False
+        self.last_access = time.time()
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def report(self, fraction):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.progress = min(max(fraction, 0.0), 1.0)
+
+    # Intermediate result (e.g. the chunks processed so far) that pages can show while the job runs
+    def publish(self, partial):
+        self.partial = partial
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self.status = "cancelled"
+
+    def run(self, fn, *args):
+        if self.cancel_event.is_set():
+            self.status = "cancelled"
+            return
+        self.status = "running"
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            self.result = fn(self, *args)
+            self.progress = 1.0
+            self.status = "done"
+        except JobCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            print(f"Error in background job {self.name}: {e}")
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.wall_ms = round((time.perf_counter() - wall_start) * 1000, 2)
+            self.cpu_ms = round((time.thread_time() - cpu_start) * 1000, 2)
+
+@st.cache_resource
+def job_registry():
+    return {
+        "executor": ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, thread_name_prefix="apnapan-job"),
+        "jobs": {},
+        "lock": threading.Lock(),
+    }
+
+# Look up a job by key; the owning session logs its timings once it has finished
+def get_job(key):
+    job = job_registry()["jobs"].get(key)
+    if job is None:
+        return None
+    job.last_access = time.time()
+    if job.done and not job.logged and job.session_id == st.session_state['session_id']:
+        job.logged = True
+        record_perf({
+            "session": job.session_id,
+            "run": st.session_state['perf_run'],
+            "dataset": job.dataset,
+            "stage": job.name,
+            "rows": job.rows,
+            "started_at": None,
+            "wall_ms": job.wall_ms,
+            "cpu_ms": job.cpu_ms,
+            "peak_mem_mb": None,
+        })
+    return job
+
+# Return the job for key, submitting fn(job, *args) if there is none yet (or restarting a finished one).
+# Small inputs run inline; returns None when the session already has MAX_JOBS_PER_SESSION jobs in flight.
+def get_or_submit_job(key, name, fn, *args, rows=None, inline=False, restart=False):
+    registry = job_registry()
+    session_id = st.session_state['session_id']
+    with registry["lock"]:
+        now = time.time()
+        for stale_key in [k for k, j in registry["jobs"].items() if j.done and now - j.last_access > JOB_RETENTION_SECONDS]:
+            del registry["jobs"][stale_key]
+        existing = registry["jobs"].get(key)
+        if existing is not None and not (restart and existing.done):
+            job = existing
+        else:
+            active = sum(1 for j in registry["jobs"].values() if j.session_id == session_id and not j.done)
+            if not inline and active >= MAX_JOBS_PER_SESSION:
+                return None
+            job = BackgroundJob(key, name, session_id, st.session_state.get('dataset_fingerprint'), rows=rows)
+            registry["jobs"][key] = job
+            if not inline:
+                job.future = registry["executor"].submit(job.run, fn, *args)
+    if inline and job.status == "queued":
+        job.run(fn, *args)
+    return get_job(key)
+
+# Cached result for key, or run fn as a job and hand its result over to dataset_cache once it finishes.
+# Returns (result, job); result is None while the job is pending, cancelled or failed.
+def cached_job_result(key, name, fn, *args, rows=None, inline=False):
+    session_id = st.session_state['session_id']
+    result = dataset_cache().get(key, session_id)
+    if result is not None:
+        return result, None
+    # A finished job whose result was already handed over (and since evicted) has to run again
+    previous_job = get_job(key)
+    job = get_or_submit_job(
+        key, name, fn, *args, rows=rows, inline=inline,
+        restart=previous_job is not None and previous_job.status == "done" and previous_job.result is None
+    )
+    if job is not None and job.status == "done" and job.result is not None:
+        result = dataset_cache().put(key, job.result, session_id)
+        job.result = None
+    return result, job
+
+# Progress bar with a cancel button (owner only); reruns the app once the job has finished or published a newer
+# partial result than the one the page was built from
+@st.fragment(run_every=1)
+def show_job_progress(job, label, shown_partial=None):
+    if job.done or job.partial is not shown_partial:
+        st.rerun()
+    st.progress(job.progress, text=f"{label}... {job.progress:.0%}")
+    if job.session_id == st.session_state['session_id'] and st.button("Cancel", key=f"cancel_{job.name}"):
+        job.cancel()
+        st.rerun()
+
+# Process-wide cache of parsed/cleaned datasets and their aggregates, keyed by content hash and shared by all sessions.
+# Sessions only hold keys; memory is bounded per session and overall, evicting idle entries least-recently-used first.
+CACHE_MEMORY_BUDGET_MB = int(os.environ.get("APNAPAN_CACHE_BUDGET_MB", 2048))
+SESSION_MEMORY_BUDGET_MB = int(os.environ.get("APNAPAN_SESSION_BUDGET_MB", 512))
+CACHE_IDLE_SECONDS = 15 * 60
+
+def estimate_nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        # deep=True walks every Python object, so extrapolate from the first rows on large frames
+        if len(value) > 10_000:
+            return int(value.head(10_000).memory_usage(deep=True).sum() * len(value) / 10_000)
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return int(value.nbytes)
+    if sparse.issparse(value):
+        # Tokenized text columns: only the stored entries and their index arrays take memory
+        csr = value.tocsr()
+        return int(csr.data.nbytes + csr.indices.nbytes + csr.indptr.nbytes)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+class SharedDatasetCache:
+    def __init__(self, max_bytes, session_max_bytes):
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        self.entries = OrderedDict()  # key -> {"value", "nbytes", "sessions", "last_access"}, oldest first
+        self.total_bytes = 0
+        self.lock = threading.RLock()
+
+    def get(self, key, session_id):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            entry["last_access"] = time.time()
+            entry["sessions"].add(session_id)
+            return entry["value"]
+
+    def put(self, key, value, session_id):
+        nbytes = estimate_nbytes(value)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {"value": value, "nbytes": nbytes, "sessions": {session_id}, "last_access": time.time()}
+            self.total_bytes += nbytes
+            self._enforce_budgets(session_id, protect=key)
+        return value
+
+    def get_or_compute(self, key, session_id, compute):
+        value = self.get(key, session_id)
+        if value is None:
+            value = self.put(key, compute(), session_id)
+        return value
+
+    # Drop a session's references, e.g. when it switches to another dataset
+    def release_session(self, session_id):
+        with self.lock:
+            for entry in self.entries.values():
+                entry["sessions"].discard(session_id)
+
+    def session_bytes(self, session_id):
+        with self.lock:
+            return sum(entry["nbytes"] for entry in self.entries.values() if session_id in entry["sessions"])
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry["nbytes"]
+
+    def _enforce_budgets(self, session_id, protect):
+        # Session budget: release this session's least recently used references; entries nobody else holds go too
+        for key in list(self.entries):
+            if self.session_bytes(session_id) <= self.session_max_bytes:
+                break
+            entry = self.entries[key]
+            if key != protect and session_id in entry["sessions"]:
+                entry["sessions"].discard(session_id)
+                if not entry["sessions"]:
+                    self._remove(key)
+        # Process budget: evict idle entries (unreferenced or untouched for CACHE_IDLE_SECONDS) first, then any LRU entry
+        now = time.time()
+        for idle_only in (True, False):
+            for key in list(self.entries):
+                if self.total_bytes <= self.max_bytes:
+                    return
+                entry = self.entries[key]
+                idle = not entry["sessions"] or now - entry["last_access"] > CACHE_IDLE_SECONDS
+                if key != protect and (idle or not idle_only):
+                    self._remove(key)
+
+@st.cache_resource
+def dataset_cache():
+    return SharedDatasetCache(CACHE_MEMORY_BUDGET_MB * 1024 ** 2, SESSION_MEMORY_BUDGET_MB * 1024 ** 2)
+
+# Map each group label (Gender, Grade, ...) to the first column whose name matches one of its keywords
+def resolve_group_columns(df, group_columns):
+    resolved = {}
+    for label, keywords in group_columns.items():
+        matched_col = next((col for col in df.columns if any(k.lower() in col.lower() for k in keywords)), None)
+        if matched_col:
+            resolved[label] = matched_col
+    return resolved
+
+# Per-value boolean mask index for every demographic column, built once per dataset (cached in dataset_cache).
+# codes holds the position of each row's value in values (-1 for missing), masks[value] is codes == position.
+def build_demographic_index(df, group_column_items):
+    index = {}
+    for label, col in group_column_items:
+        try:
+            codes, uniques = pd.factorize(df[col], sort=True)
+        except TypeError:  # mixed value types (e.g. 9 and "9th") cannot be sorted
+            codes, uniques = pd.factorize(df[col])
+        values = list(uniques)
+        index[label] = {
+            "column": col,
+            "codes": codes,
+            "values": values,
+            "masks": {value: codes == i for i, value in enumerate(values)},
+        }
+    return index
+
+# OR the masks of the values chosen within one demographic, AND across demographics
+def intersect_filters(demographic_index, selections, n_rows):
+    mask = np.ones(n_rows, dtype=bool)
+    for label, selected_values in selections.items():
+        if not selected_values:
+            continue
+        value_masks = demographic_index[label]["masks"]
+        selected = np.zeros(n_rows, dtype=bool)
+        for value in selected_values:
+            selected |= value_masks[value]
+        mask &= selected
+    return mask
+
+# Compact numeric encoding of the matched Likert items, built once per dataset and shared by every filter slice
+def build_item_arrays(df, item_cols, belonging_cols):
+    values = df[list(item_cols)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float32)
+    answered = (~np.isnan(values)).astype(np.float32)
+    filled = np.nan_to_num(values, nan=0.0)
+    # A question matched by several constructs counts once per construct, as in the BelongingRaw sum
+    weights = np.array([belonging_cols.count(col) for col in item_cols], dtype=np.float32)
+    raw = filled @ weights
+    count = answered @ weights
+    score = np.divide(raw, count, out=np.zeros_like(raw), where=count > 0)
+    return {
+        "columns": list(item_cols),
+        "values": values,
+        "filled": filled,
+        "answered": answered,
+        "raw": raw,
+        "count": count,
+        "score": score,
+    }
+
+# Overall score and construct averages for the rows selected by mask, using mask-weighted sums (no row copies)
+def masked_belonging_metrics(item_arrays, matched_questions, mask):
+    row_weights = mask.astype(np.float32)
+    n_rows = row_weights.sum()
+    if n_rows == 0:
+        return None, {}
+    overall = float(item_arrays["score"] @ row_weights / n_rows)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        column_means = (row_weights @ item_arrays["filled"]) / (row_weights @ item_arrays["answered"])
+    position = {col: i for i, col in enumerate(item_arrays["columns"])}
+    category_averages = {
+        cat: pd.Series(column_means[[position[col] for col in cols]]).mean() if cols else 0
+        for cat, cols in matched_questions.items()
+    }
+    return overall, category_averages
+
+# Mean and count of a numeric column per group value, restricted to the rows in mask
+def masked_group_average(entry, values, mask):
+    valid = mask & (entry["codes"] >= 0) & ~np.isnan(values)
+    bins = len(entry["values"])
+    counts = np.bincount(entry["codes"][valid], minlength=bins)
+    sums = np.bincount(entry["codes"][valid], weights=values[valid], minlength=bins)
+    present = counts > 0
+    return pd.DataFrame({
+        entry["column"]: np.asarray(entry["values"], dtype=object)[present],
+        "AvgScore": sums[present] / counts[present],
+        "Count": counts[present],
+    })
+
+# Mean and count of every construct's question by every demographic group (one job for all charts)
+def aggregate_all_groups(job, area_values, demographic_index, mask):
+    aggregates = {}
+    total = max(len(area_values) * len(demographic_index), 1)
+    for area, values in area_values.items():
+        for label, entry in demographic_index.items():
+            job.report(len(aggregates) / total)
+            aggregates[(area, label)] = masked_group_average(entry, values, mask)
+    return aggregates
+
+# Response-quality flags from a few array passes over the Likert matrix plus two row hashes
+STRAIGHTLINE_MIN_ITEMS = 5
+MIN_ANSWERED_FRACTION = 0.5
+
+def screen_response_quality(df, likert_cols, demographic_cols):
+    values = df[likert_cols].to_numpy(dtype=np.float32)
+    answered = ~np.isnan(values)
+    answered_count = answered.sum(axis=1)
+    # Zero variance over the answered items: the lowest and highest answer are the same
+    row_min = np.where(answered, values, np.inf).min(axis=1)
+    row_max = np.where(answered, values, -np.inf).max(axis=1)
+    exact = pd.util.hash_pandas_object(df, index=False).duplicated().to_numpy()
+    # Same answers and demographics, but a different ID, free-text answer, etc.
+    same_answers = pd.util.hash_pandas_object(df[likert_cols + demographic_cols], index=False).duplicated().to_numpy()
+    return {
+        "Straight-lining": (answered_count >= min(STRAIGHTLINE_MIN_ITEMS, len(likert_cols))) & (row_min == row_max),
+        "Too few answers": answered_count < MIN_ANSWERED_FRACTION * len(likert_cols),
+        "Exact duplicate": exact,
+        "Near duplicate": same_answers & ~exact & (answered_count > 0),
+    }
+
+# Missing-data stage, run on the encoded Likert matrix after quality screening
+MISSING_STRATEGIES = ["None", "Item mean", "Construct mean", "Group mean", "Drop below threshold"]
+
+# Fill NaNs column by column, in place on the float32 matrix. "Construct mean" uses the respondent's own mean over the
+# other items of the same construct, "Group mean" the item's mean within the respondent's demographic group.
+# Returns the number of values imputed per column.
+def impute_item_matrix(values, strategy, construct_members=(), group_codes=None):
+    missing = np.isnan(values)
+    missing_counts = missing.sum(axis=0)
+    to_fill = np.flatnonzero(missing_counts)
+    if strategy == "Item mean":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            item_means = np.nansum(values, axis=0) / (~missing).sum(axis=0)
+        for j in to_fill:
+            values[missing[:, j], j] = item_means[j]
+    elif strategy == "Construct mean":
+        # Respondent means are all taken from the original answers before anything is filled, so a question shared
+        # by several constructs never feeds an imputed value back into a mean; it gets the average of their means
+        with np.errstate(invalid="ignore", divide="ignore"):
+            respondent_means = [
+                np.nansum(values[:, members], axis=1) / (~missing[:, members]).sum(axis=1) for members in construct_members
+            ]
+        for j in to_fill:
+            means = [m for members, m in zip(construct_members, respondent_means) if j in members]
+            if not means:
+                continue
+            candidates = np.vstack([m[missing[:, j]] for m in means])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fill = np.nansum(candidates, axis=0) / (~np.isnan(candidates)).sum(axis=0)
+            values[missing[:, j], j] = fill
+    elif strategy == "Group mean" and group_codes is not None:
+        in_group = group_codes >= 0
+        bins = group_codes.max() + 1 if in_group.any() else 0
+        for j in to_fill:
+            observed = in_group & ~missing[:, j]
+            sums = np.bincount(group_codes[observed], weights=values[observed, j], minlength=bins)
+            counts = np.bincount(group_codes[observed], minlength=bins)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                group_means = np.append(sums / counts, np.nan)  # code -1 picks the trailing NaN
+            values[missing[:, j], j] = group_means[group_codes[missing[:, j]]]
+    return missing_counts - np.isnan(values).sum(axis=0)
+
+def build_imputed_matrix(df, likert_cols, strategy, construct_members, group_codes):
+    values = df[likert_cols].to_numpy(dtype=np.float32)
+    imputed = impute_item_matrix(values, strategy, construct_members, group_codes)
+    return {"values": values, "imputed": imputed}
+
+# Pairwise-complete sums for the columns of x (NaN = missing), from masked matrix products instead of per-pair calls.
+# For columns i, j: n[i, j] rows have both, sums[i, j] / squares[i, j] sum column i over those rows, cross[i, j] = sum x_i * x_j.
+def pairwise_moments(x):
+    present = (~np.isnan(x)).astype(np.float64)
+    filled = np.nan_to_num(x, nan=0.0).astype(np.float64)
+    n = present.T @ present
+    sums = filled.T @ present
+    squares = (filled ** 2).T @ present
+    cross = filled.T @ filled
+    return n, sums, squares, cross
+
+# Pearson correlation of every column pair over the rows where both are answered (NaN when fewer than 3 rows)
+def pairwise_correlation(x):
+    n, sums, squares, cross = pairwise_moments(x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = (n * cross - sums * sums.T) / np.sqrt((n * squares - sums ** 2) * (n * squares - sums ** 2).T)
+    corr[n < 3] = np.nan
+    return np.clip(corr, -1, 1), n
+
+# Cronbach's alpha, corrected item-total correlation and alpha-if-item-deleted for every construct, all read off one
+# pairwise-complete covariance matrix of the matched items. Deleting item i only changes the block sums, so every
+# alpha-if-deleted and item-total value is a vector expression over the construct's block.
+RELIABILITY_MIN_ALPHA = 0.6
+RELIABILITY_MIN_ITEM_TOTAL = 0.3
+
+def construct_reliability(item_arrays, matched_questions):
+    n, sums, squares, cross = pairwise_moments(item_arrays["values"])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = (cross - sums * sums.T / n) / (n - 1)
+    cov[n < 3] = np.nan
+    position = {col: i for i, col in enumerate(item_arrays["columns"])}
+    construct_rows, item_rows = [], []
+    for cat, cols in matched_questions.items():
+        if not cols:
+            continue
+        idx = [position[col] for col in cols]
+        block = cov[np.ix_(idx, idx)]
+        k = len(idx)
+        variances = np.diag(block)
+        total_var = block.sum()
+        row_sums = block.sum(axis=1)
+        rest_var = total_var - 2 * row_sums + variances  # variance of the sum of the other items
+        with np.errstate(invalid="ignore", divide="ignore"):
+            alpha = k / (k - 1) * (1 - variances.sum() / total_var) if k > 1 else np.nan
+            item_total = (row_sums - variances) / np.sqrt(variances * rest_var)
+            if k > 2:
+                alpha_deleted = (k - 1) / (k - 2) * (1 - (variances.sum() - variances) / rest_var)
+            else:
+                alpha_deleted = np.full(k, np.nan)
+        construct_rows.append({
+            "Construct": cat,
+            "Items": k,
+            "Cronbach's Alpha": alpha,
+            "Min. Pairwise N": int(n[np.ix_(idx, idx)].min()),
+        })
+        for j, col in enumerate(cols):
+            review = (
+                np.isnan(item_total[j]) or item_total[j] < RELIABILITY_MIN_ITEM_TOTAL
+                or (k > 2 and alpha_deleted[j] > alpha)
+            )
+            item_rows.append({
+                "Construct": cat,
+                "Question": col,
+                "Item-Total r": item_total[j],
+                "Alpha if Deleted": alpha_deleted[j],
+                "Check": "Review" if review and k > 1 else "",
+            })
+    return {
+        "constructs": pd.DataFrame(construct_rows).round(3),
+        "items": pd.DataFrame(item_rows).round(3),
+    }
+
+# Correlations across matched items, construct scores and BelongingScore, plus a standardized regression of
+# BelongingScore on the construct scores (complete rows only), for the rows in mask
+def driver_analysis(item_arrays, matched_questions, mask):
+    position = {col: i for i, col in enumerate(item_arrays["columns"])}
+    constructs = [cat for cat, cols in matched_questions.items() if cols]
+    membership = np.zeros((len(position), len(constructs)), dtype=np.float32)
+    for j, cat in enumerate(constructs):
+        membership[[position[col] for col in matched_questions[cat]], j] = 1
+
+    filled = item_arrays["filled"][mask]
+    answered = item_arrays["answered"][mask]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        construct_scores = (filled @ membership) / (answered @ membership)
+    belonging = np.where(item_arrays["count"][mask] > 0, item_arrays["score"][mask], np.nan)
+    matrix = np.column_stack([item_arrays["values"][mask], construct_scores, belonging])
+    corr, pair_counts = pairwise_correlation(matrix)
+
+    complete = ~np.isnan(construct_scores).any(axis=1) & ~np.isnan(belonging)
+    x, y = construct_scores[complete].astype(np.float64), belonging[complete].astype(np.float64)
+    betas = np.full(len(constructs), np.nan)
+    r_squared = np.nan
+    varying = x.std(axis=0) > 0 if len(x) else np.zeros(len(constructs), dtype=bool)
+    if len(x) > varying.sum() + 1 and varying.any() and y.std() > 0:
+        x_std = (x[:, varying] - x[:, varying].mean(axis=0)) / x[:, varying].std(axis=0)
+        y_std = (y - y.mean()) / y.std()
+        coefficients, *_ = np.linalg.lstsq(np.column_stack([np.ones(len(x_std)), x_std]), y_std, rcond=None)
+        betas[varying] = coefficients[1:]
+        residuals = y_std - np.column_stack([np.ones(len(x_std)), x_std]) @ coefficients
+        r_squared = 1 - (residuals ** 2).sum() / (y_std ** 2).sum()
+
+    construct_pos = len(position) + np.arange(len(constructs))
+    return {
+        "labels": list(item_arrays["columns"]) + constructs + ["BelongingScore"],
+        "corr": corr,
+        "pair_counts": pair_counts,
+        "constructs": constructs,
+        "construct_pos": construct_pos,
+        "drivers": pd.DataFrame({
+            "Construct": constructs,
+            "Correlation with Belonging": corr[construct_pos, -1],
+            "Standardized Beta": betas,
+        }).round(3),
+        "r_squared": r_squared,
+        "n_complete": int(complete.sum()),
+    }
+
+# value_counts(dropna=False) equivalent for the rows in mask
+def masked_value_counts(entry, mask, label):
+    counts = np.bincount(entry["codes"][mask] + 1, minlength=len(entry["values"]) + 1)
+    value_counts = pd.DataFrame({label: [np.nan] + entry["values"], "Count": counts})
+    return value_counts[value_counts["Count"] > 0].sort_values("Count", ascending=False).reset_index(drop=True)
+
+# Submission-time trends. The first timestamp column that mostly parses becomes a day number per row (-1 = unknown);
+# rows are bucketed by day once, and every window size is a difference of the cumulative per-day sums. Days are
+# numbered over the distinct dates that occur, so a stray 1900 timestamp adds one day, not 45,000 empty ones.
+TREND_WINDOWS = [1, 7, 14, 30]
+
+def parse_submission_times(df, timestamp_cols):
+    for col in timestamp_cols:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            times = df[col]
+        elif df[col].dtype == object:
+            times = pd.to_datetime(df[col], errors="coerce")
+        else:
+            continue  # numeric "time taken" style columns are durations, not timestamps
+        if times.notna().mean() >= 0.5:
+            if getattr(times.dt, "tz", None) is not None:
+                times = times.dt.tz_localize(None)
+            return times.to_numpy(dtype="datetime64[ns]")
+    return None
+
+# codes index the sorted distinct dates; day_offsets holds each date's distance in days from first_day
+def submission_day_codes(times):
+    days = times.astype("datetime64[D]")
+    valid = ~np.isnat(days)
+    unique_days, valid_codes = np.unique(days[valid], return_inverse=True)
+    codes = np.full(len(days), -1, dtype=np.int64)
+    codes[valid] = valid_codes
+    first_day = unique_days[0] if len(unique_days) else np.datetime64("NaT", "D")
+    return {
+        "codes": codes,
+        "first_day": first_day,
+        "day_offsets": (unique_days - first_day).astype(np.int64),
+        "n_days": len(unique_days),
+    }
+
+# Cumulative per-day sums and answer counts of each column of values (NaN = missing) per group, shaped
+# (n_days + 1, n_groups, n_columns) with a leading zero row, for the rows in mask; n_days counts distinct dates
+def cumulative_day_sums(day_index, values, mask, group_codes=None, n_groups=1):
+    day_codes = day_index["codes"]
+    if group_codes is None:
+        group_codes = np.zeros(len(day_codes), dtype=np.int64)
+    rows = mask & (day_codes >= 0) & (group_codes >= 0)
+    n_bins = day_index["n_days"] * n_groups
+    bins = day_codes[rows] * n_groups + group_codes[rows]
+    sums = np.zeros((n_bins, values.shape[1]))
+    counts = np.zeros((n_bins, values.shape[1]))
+    for j in range(values.shape[1]):
+        column = values[rows, j]
+        answered = ~np.isnan(column)
+        sums[:, j] = np.bincount(bins[answered], weights=column[answered], minlength=n_bins)
+        counts[:, j] = np.bincount(bins[answered], minlength=n_bins)
+    shape = (day_index["n_days"], n_groups, values.shape[1])
+    zero_row = np.zeros((1, n_groups, values.shape[1]))
+    return {
+        "sums": np.concatenate([zero_row, sums.reshape(shape).cumsum(axis=0)]),
+        "counts": np.concatenate([zero_row, counts.reshape(shape).cumsum(axis=0)]),
+    }
+
+# Sums per window of window_days calendar days from first_day; windows without any submission are left out.
+# Returns each window's start as a day offset from first_day.
+def bucket_day_sums(cumulative, day_offsets, window_days):
+    buckets = day_offsets // window_days
+    first_in_bucket = np.flatnonzero(np.diff(buckets, prepend=-1))
+    edges = np.append(first_in_bucket, len(day_offsets))
+    sums = cumulative["sums"][edges[1:]] - cumulative["sums"][edges[:-1]]
+    counts = cumulative["counts"][edges[1:]] - cumulative["counts"][edges[:-1]]
+    return buckets[first_in_bucket] * window_days, sums, counts
+
+# Open-ended answers: columns that are neither Likert nor demographic. Each distinct response is tokenized once
+# (unigrams and bigrams, English and Hinglish stopwords removed) into a sparse response x term matrix; per-row
+# counts for any filter or group split are then one sparse product with a group x response membership matrix.
+TEXT_MIN_WORDS = 2
+TEXT_TOP_TERMS = 20
+HINGLISH_STOPWORDS = frozenset("""
+    hai hain ho hota hoti hote hona tha thi the ka ki ke ko se me mein main mai par pe aur ya bhi to toh na nahi
+    nahin kya koi kuch ek yeh ye woh wo vo us jo jab tab kab kaise kyun kyon mera meri mere hum hamara hamari tum
+    tumhara aap apna apni apne unka unki uska uski iska iski sab sabhi kar karna karte karti kiya kiye raha rahi
+    rahe gaya gayi wala wali wale liye lekin magar agar phir fir abhi ab yaha yahan waha wahan hi ji haan ha bahut
+    bohot bhot kaash
+""".split())
+
+# Object columns outside exclude_cols whose distinct answers average at least TEXT_MIN_WORDS words
+def detect_text_cols(df, exclude_cols):
+    text_cols = []
+    for col in df.columns:
+        if col in exclude_cols or df[col].dtype != object:
+            continue
+        uniques = pd.Series(df[col].dropna().unique()).astype(str)
+        if len(uniques) and uniques.str.split().str.len().mean() >= TEXT_MIN_WORDS:
+            text_cols.append(col)
+    return text_cols
+
+def build_text_terms(series):
+    codes, uniques = pd.factorize(series.astype("string").str.strip().str.lower())
+    vectorizer = CountVectorizer(
+        ngram_range=(1, 2),
+        stop_words=sorted(ENGLISH_STOP_WORDS | HINGLISH_STOPWORDS),
+        token_pattern=r"(?u)\b[^\W\d_]{2,}\b"
+    )
+    try:
+        counts = vectorizer.fit_transform(uniques.astype(str)).tocsr()
+        terms = vectorizer.get_feature_names_out()
+    except ValueError:  # nothing left after stopword removal
+        counts = sparse.csr_matrix((len(uniques), 0), dtype=np.int64)
+        terms = np.array([], dtype=object)
+    return {"codes": codes, "terms": terms, "counts": counts, "present": (counts > 0).astype(np.int64)}
+
+# Occurrences and responses mentioning each term, plus responses per group, for the rows in mask
+def term_frequencies(text_terms, mask, group_codes=None, n_groups=1):
+    codes = text_terms["codes"]
+    if group_codes is None:
+        group_codes = np.zeros(len(codes), dtype=np.int64)
+    valid = mask & (codes >= 0) & (group_codes >= 0)
+    membership = sparse.csr_matrix(
+        (np.ones(int(valid.sum()), dtype=np.int64), (group_codes[valid], codes[valid])),
+        shape=(n_groups, text_terms["counts"].shape[0])
+    )
+    occurrences = (membership @ text_terms["counts"]).toarray()
+    responses = (membership @ text_terms["present"]).toarray()
+    return occurrences, responses, np.asarray(membership.sum(axis=1)).ravel()
+
+# Report charts are rasterized one after another inside the report job (kaleido sends every export through a single
+# subprocess behind a lock, so extra threads would only queue) and cached on disk by figure fingerprint: a figure
+# that did not change is never rendered twice. The cache keeps the most recently used images up to
+# APNAPAN_CHART_CACHE_MB; temporary files left by interrupted renders are removed after an hour.
+CHART_IMAGE_DIR = os.path.join(tempfile.gettempdir(), "apnapan_charts")
+CHART_CACHE_MAX_MB = int(os.environ.get("APNAPAN_CHART_CACHE_MB", 200))
+CHART_TMP_MAX_AGE_SECONDS = 60 * 60
+CHART_IMAGE_WIDTH = 700
+CHART_IMAGE_HEIGHT = 500
+
+def figure_fingerprint(fig_json):
+    return hashlib.blake2b(fig_json.encode("utf-8"), digest_size=12).hexdigest()
+
+# JPEG rather than PNG: FPDF embeds JPEG data as-is but splits PNG alpha channels pixel by pixel in Python
+def rasterize_figure(fig_json, path):
+    try:
+        # Reuse counts as a use for pruning, which removes the least recently used images first
+        os.utime(path)
+    except FileNotFoundError:
+        # Write to a private file first so a concurrent render of the same figure never sees a partial JPEG
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        pio.from_json(fig_json).write_image(
+            tmp_path, format="jpg", width=CHART_IMAGE_WIDTH, height=CHART_IMAGE_HEIGHT, scale=2
+        )
+        os.replace(tmp_path, path)
+    return path
+
+def rasterize_figures(job, fig_jsons, progress_range=(0.0, 1.0)):
+    os.makedirs(CHART_IMAGE_DIR, exist_ok=True)
+    start, end = progress_range
+    paths = []
+    for i, fig_json in enumerate(fig_jsons):
+        paths.append(rasterize_figure(fig_json, os.path.join(CHART_IMAGE_DIR, figure_fingerprint(fig_json) + ".jpg")))
+        job.report(start + (end - start) * (i + 1) / len(fig_jsons))
+    prune_chart_images(CHART_CACHE_MAX_MB * 1024 * 1024, keep=set(paths))
+    return paths
+
+def prune_chart_images(max_bytes, keep=()):
+    now = time.time()
+    images = []
+    for entry in os.scandir(CHART_IMAGE_DIR):
+        try:
+            stat = entry.stat()
+            if entry.name.endswith(".tmp"):
+                if now - stat.st_mtime > CHART_TMP_MAX_AGE_SECONDS:
+                    os.remove(entry.path)
+            else:
+                images.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            continue  # removed by a concurrent report job
+    total_bytes = sum(size for _, size, _ in images)
+    for _, size, path in sorted(images):
+        if total_bytes <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+# Offline HTML export: one embedded copy of plotly.js, figures as compact JSON with the (shared) layout template
+# stored once, and the metric cards as static HTML
+HTML_CARD_COLORS = {
+    "Overall Belonging Score": "#0066cc", "Safety": "#009900", "Respect": "#ff9933", "Welcome": "#cc0066",
+    "Participation": "#663399", "Acknowledgement": "#008080", "Relationships with Teachers": "#996633",
+}
+
+@st.cache_resource
+def plotly_js_source():
+    from plotly.offline import get_plotlyjs
+    return get_plotlyjs()
+
+def build_html_report(school_name, overall_score, averages, figures):
+    templates, template_index, charts = [], {}, []
+    for section, per_row, fig_json in figures:
+        fig_dict = json.loads(fig_json)
+        layout = fig_dict.get("layout", {})
+        template = json.dumps(layout.pop("template", {}), separators=(",", ":"))
+        if template not in template_index:
+            template_index[template] = len(templates)
+            templates.append(template)
+        charts.append({"section": section, "per_row": per_row, "t": template_index[template],
+                       "data": fig_dict.get("data", []), "layout": layout})
+
+    cards = "".join(
+        f'<div class="card" style="background:{HTML_CARD_COLORS.get(label, "#336699")}">'
+        f'<div class="label">{html.escape(label)}</div><div class="value">{value:.2f}</div></div>'
+        for label, value in [("Overall Belonging Score", overall_score or 0), *averages.items()]
+    )
+    body, current_section = [], None
+    for i, chart in enumerate(charts):
+        if chart["section"] != current_section:
+            if current_section is not None:
+                body.append("</div>")
+            current_section = chart["section"]
+            body.append(f'<h2>{html.escape(current_section)}</h2><div class="grid">')
+        body.append(f'<div class="chart" id="chart-{i}" style="flex-basis:{100 // chart["per_row"] - 2}%"></div>')
+    if current_section is not None:
+        body.append("</div>")
+
+    # "</" inside inline JSON would end the script element early
+    chart_json = json.dumps(
+        [{"t": c["t"], "data": c["data"], "layout": c["layout"]} for c in charts], separators=(",", ":")
+    ).replace("</", "<\\/")
+    template_json = ("[" + ",".join(templates) + "]").replace("</", "<\\/")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(school_name)} - Data Insights Snapshot</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 2rem; color: #222; }}
+h1 {{ color: #003366; text-align: center; margin-bottom: 0; }}
+.subtitle {{ text-align: center; color: #555; margin-bottom: 2rem; }}
+h2 {{ color: #003366; border-bottom: 2px solid #003366; padding-bottom: 0.3rem; }}
+.cards, .grid {{ display: flex; flex-wrap: wrap; gap: 1rem; }}
+.card {{ flex: 1 1 12rem; color: white; border-radius: 10px; padding: 1rem; text-align: center; }}
+.card .label {{ font-weight: bold; }} .card .value {{ font-size: 1.8rem; }}
+.chart {{ flex-grow: 1; min-width: 320px; min-height: 420px; }}
+</style>
+<script type="text/javascript">{plotly_js_source()}</script>
+</head><body>
+<h1>{html.escape(school_name)}</h1>
+<div class="subtitle">Data Insights Snapshot - {datetime.today().strftime("%B %d, %Y")}</div>
+<h2>Belonging Dashboard</h2><div class="cards">{cards}</div>
+{"".join(body)}
+<script type="text/javascript">
+const templates = {template_json};
+const charts = {chart_json};
+charts.forEach(function (chart, i) {{
+    chart.layout.template = templates[chart.t];
+    Plotly.newPlot("chart-" + i, chart.data, chart.layout, {{responsive: true, displaylogo: false}});
+}});
+</script>
+<p class="subtitle">Generated using the Project Apnapan Data Insights Tool</p>
+</body></html>"""
+
 # Function to navigate to a specific page
 def navigate_to(page):
     st.session_state['current_page'] = page
@@ -270,6 +1223,422 @@ questionnaire_mapping = {
     "Agree": 4,
     "Strongly Agree": 5
 }
+
+# Columns holding at least one Likert response (checked over each column's unique values)
+def detect_questionnaire_cols(df):
+    return [col for col in df.columns if any(str(val).strip().title() in questionnaire_mapping for val in df[col].dropna().unique())]
+
+def categorize_income(possessions: str) -> str:
+    if pd.isna(possessions):
+        return "Unknown"
+    items = possessions.lower()
+    has_car = "car" in items
+    has_computer = "computer" in items or "laptop" in items
+    has_home = "apna ghar" in items
+    is_rented = "rent" in items
+    if has_car and has_home:
+        return "High"
+    if has_computer or (has_home and not has_car):
+        return "Mid"
+    return "Low"
+
+# Likert encoding plus derived ethnicity and income columns. Pure pandas, so it can also run off the script thread.
+def clean_survey_data(df, questionnaire_cols):
+    df_cleaned = df.copy()
+    for col in questionnaire_cols:
+        df_cleaned[col] = df_cleaned[col].astype(str).str.strip().str.title()
+        df_cleaned[col] = df_cleaned[col].map(questionnaire_mapping).fillna(df_cleaned[col])
+        df_cleaned[col] = pd.to_numeric(df_cleaned[col], errors='coerce')
+
+    ethnicity_column = next((col for col in df_cleaned.columns if "ethnicity" in col.lower()), None)
+    if ethnicity_column:
+        df_cleaned["ethnicity_cleaned"] = df_cleaned[ethnicity_column].replace({
+            v: "General" if "general" in str(v).lower() else
+            "SC" if "sc" in str(v).lower() else
+            "OBC" if "other" in str(v).lower() else
+            "Don't Know" if "do" in str(v).lower() else
+            "ST" if "st" in str(v).lower() else v
+            for v in df_cleaned[ethnicity_column].unique()
+        })
+
+    # Income category is derived up front so it can be used as a drill-down filter
+    possessions_col = next((col for col in df_cleaned.columns if "what items among these do you have at home".lower() in col.lower()), None)
+    if possessions_col:
+        df_cleaned["Income Category"] = df_cleaned[possessions_col].apply(categorize_income)
+    return df_cleaned
+
+# Progressive mode: uploads with at least PROGRESSIVE_MIN_ROWS rows are first shown on a stratified sample
+# (labelled provisional) while the full file is cleaned in the background, chunk by chunk. Rows are cleaned in a
+# shuffled order, so the chunks done so far are a random sample; it is published after 1, 2, 4, ... chunks and
+# replaces the provisional results, which keeps the number of full-page refreshes logarithmic in the file size.
+PROGRESSIVE_MIN_ROWS = 100_000
+PROGRESSIVE_SAMPLE_ROWS = 20_000
+PROGRESSIVE_CHUNK_ROWS = 50_000
+
+# Same fraction drawn from every stratum, so group proportions match the full file
+def stratified_sample(df, strata_cols, n_rows, seed=42):
+    if not strata_cols:
+        return df.sample(n=n_rows, random_state=seed)
+    fraction = n_rows / len(df)
+    return df.groupby(strata_cols, group_keys=False, dropna=False).sample(frac=fraction, random_state=seed)
+
+def clean_in_chunks(job, df, questionnaire_cols, seed=42):
+    order = np.random.default_rng(seed).permutation(len(df))
+    parts = []
+    for start in range(0, len(df), PROGRESSIVE_CHUNK_ROWS):
+        job.report(start / len(df))
+        parts.append(clean_survey_data(df.iloc[order[start:start + PROGRESSIVE_CHUNK_ROWS]], questionnaire_cols))
+        if len(parts) & (len(parts) - 1) == 0:
+            job.publish(tuple(parts))
+    # Back to file order; the index is kept, as submission times are looked up by it
+    return pd.concat(parts).sort_index()
+
+# Compressed uploads are decompressed as a stream into the CSV reader, so the decompressed text is never held in
+# memory as a whole. A zip with several files becomes one dataset with a Source File column for grouping. The
+# in-memory path parses each file in one go, so column types are inferred over the whole file as before; only the
+# low-memory writer reads PARSE_CHUNK_ROWS at a time.
+COMPRESSION_SUFFIXES = {"gz": "gzip", "bz2": "bz2", "xz": "xz"}
+PARSE_CHUNK_ROWS = 100_000
+SOURCE_FILE_COLUMN = "Source File"
+
+# Demographic columns used for filters and group charts, and the keywords mapping questions to constructs
+GROUP_COLUMNS = {
+    "Gender": ["gender", "What gender do you use"],
+    "Grade": ["grade", "Which grade are you in"],
+    "Income Status": ["Income Category"],
+    "Health Condition": ["disability", "health condition"],
+    "Ethnicity": ["ethnicity_cleaned"],
+    "Religion": ["religion"],
+    "Source File": [SOURCE_FILE_COLUMN]
+}
+
+BELONGING_QUESTIONS = {
+    "Safety": ["safe", "surakshit"],
+    "Respect": ["respected","respect", "izzat", "as much respect"],
+    "Welcome": ["being welcomed", "welcome", "swagat"],
+    "Relationships with Teachers": ["one teacher", "share your problem", "care about your feelings", "close to your teachers", "close teacher"],
+    "Participation": ["opportunities", "participate", "school activities", "take part"],
+    "Acknowledgement": ["notice", "noticed", "listen to you", "dekhein", "acknowledge", "recognized", "valued", "heard", "seen", "like you"]
+}
+
+STREAMABLE_TYPES = ["csv", "txt", *COMPRESSION_SUFFIXES, "zip"]
+
+def upload_file_type(uploaded_file):
+    return uploaded_file.name.split('.')[-1].lower()
+
+# Yields the upload as DataFrames (CSV, TXT, compressed or zipped): chunks of at most chunksize rows, or one frame
+# per file when chunksize is None
+def iter_upload_chunks(uploaded_file, chunksize=PARSE_CHUNK_ROWS):
+    def parse(stream, **kwargs):
+        if chunksize is None:
+            # low_memory=False: otherwise read_csv infers types per internal block and can still mix 9 and "9"
+            return [pd.read_csv(stream, low_memory=False, **kwargs)]
+        return pd.read_csv(stream, chunksize=chunksize, **kwargs)
+
+    file_type = upload_file_type(uploaded_file)
+    if file_type != "zip":
+        yield from parse(uploaded_file, compression=COMPRESSION_SUFFIXES.get(file_type))
+        return
+    with zipfile.ZipFile(uploaded_file) as archive:
+        members = [
+            member for member in archive.infolist()
+            if not member.is_dir() and not member.filename.startswith("__MACOSX/")
+            and member.filename.lower().endswith((".csv", ".txt"))
+        ]
+        if not members:
+            raise ValueError("The zip archive does not contain any CSV or TXT files.")
+        for member in members:
+            with archive.open(member) as stream:
+                for chunk in parse(stream):
+                    if len(members) > 1:
+                        chunk[SOURCE_FILE_COLUMN] = os.path.basename(member.filename)
+                    yield chunk
+
+# Text form of a column, as read_csv keeps a column that also holds text: 9 becomes "9" (not "9.0"), missing stays NaN
+def column_as_text(values):
+    if values.dtype.kind == "f" and (values.dropna() % 1 == 0).all():
+        values = values.astype("Int64")
+    return values.astype(str).where(values.notna())
+
+# Files of a zip are parsed separately and can disagree on a column's type (9 in one, "9"/"Other" in another).
+# Such columns are turned to text in every frame, so the same answer never ends up as two demographic groups.
+def concat_upload_frames(frames):
+    if len(frames) == 1:
+        return frames[0]
+    for col in set().union(*(frame.columns for frame in frames)):
+        kinds = {frame[col].dtype.kind for frame in frames if col in frame.columns}
+        if "O" in kinds and len(kinds) > 1:
+            for frame in frames:
+                if col in frame.columns:
+                    frame[col] = column_as_text(frame[col])
+    return pd.concat(frames, ignore_index=True)
+
+def read_uploaded_file(uploaded_file):
+    file_type = upload_file_type(uploaded_file)
+    if file_type in STREAMABLE_TYPES:
+        return concat_upload_frames(list(iter_upload_chunks(uploaded_file, chunksize=None)))
+    if file_type in ["xlsx", "xls"]:
+        return pd.read_excel(uploaded_file)
+    return None
+
+# Offline Hindi/Hinglish -> English normalization. Header terms are replaced as whole words (so "surakshit" matches
+# the Safety keywords as "safe"); response values are replaced only when the whole answer is a dictionary entry.
+# The bundled dictionary can be extended with a JSON file of the same shape named by APNAPAN_DICTIONARY_PATH.
+HINGLISH_DICTIONARY_PATH = "data/hinglish_dictionary.json"
+NORMALIZE_MAX_DISTINCT = 1000
+DEVANAGARI_WORD_CHARS = r"\w\u0900-\u097F"  # vowel signs are not \w, so plain \b would split Hindi words
+
+@st.cache_resource
+def hinglish_dictionary():
+    entries = {"headers": {}, "values": {}}
+    for path in [HINGLISH_DICTIONARY_PATH, os.environ.get("APNAPAN_DICTIONARY_PATH")]:
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as dictionary_file:
+                extra = json.load(dictionary_file)
+            for section in entries:
+                entries[section].update({term.strip().lower(): english for term, english in extra.get(section, {}).items()})
+    header_terms = sorted(entries["headers"], key=len, reverse=True)  # longest first, so phrases win over their words
+    header_pattern = re.compile(
+        rf"(?<![{DEVANAGARI_WORD_CHARS}])({'|'.join(map(re.escape, header_terms))})(?![{DEVANAGARI_WORD_CHARS}])",
+        re.IGNORECASE
+    ) if header_terms else None
+    return {"header_map": entries["headers"], "header_pattern": header_pattern, "value_map": entries["values"]}
+
+def normalize_header(header, dictionary):
+    if dictionary["header_pattern"] is None or not isinstance(header, str):
+        return header
+    return dictionary["header_pattern"].sub(lambda match: dictionary["header_map"][match.group(0).lower()], header)
+
+# Normalizes a freshly parsed frame in place: one dictionary lookup per distinct value of each text column.
+# Returns the number of renamed headers and of replaced distinct values.
+def normalize_hinglish(df, dictionary):
+    renamed = {}
+    for col in df.columns:
+        new_name = normalize_header(col, dictionary)
+        if new_name != col and new_name not in df.columns and new_name not in renamed.values():
+            renamed[col] = new_name
+    if renamed:
+        df.rename(columns=renamed, inplace=True)
+
+    replaced = 0
+    if dictionary["value_map"]:
+        for col in df.columns:
+            if df[col].dtype != object:
+                continue
+            # unique() is much cheaper than factorize(); only columns with a dictionary hit pay for the rewrite.
+            # IDs, timestamps and free text have too many distinct values to be answer options and are skipped.
+            if df[col].iloc[:2 * NORMALIZE_MAX_DISTINCT].nunique() > NORMALIZE_MAX_DISTINCT:
+                continue
+            uniques = df[col].unique()
+            if len(uniques) > NORMALIZE_MAX_DISTINCT:
+                continue
+            uniques = uniques[~pd.isna(uniques)]
+            english = pd.Index(uniques.astype(str)).str.strip().str.lower().map(dictionary["value_map"])
+            hits = ~pd.isna(english)
+            if hits.any():
+                codes = pd.Index(uniques).get_indexer(df[col])
+                lookup = np.where(hits, english, uniques)
+                df[col] = np.append(lookup, np.nan)[codes]  # code -1 (missing) picks the trailing NaN
+                replaced += int(hits.sum())
+    return len(renamed), replaced
+
+# Low-memory mode for district-scale files: the upload is streamed chunk by chunk into memory-mapped arrays on local
+# disk, the encoded Likert items as int8 (0 = missing) and the demographic codes as int32 (-1 = missing), so no full
+# DataFrame is ever built. Scoring, filtering and group aggregation then read the arrays MMAP_BLOCK_ROWS at a time.
+# Stores not opened for APNAPAN_MMAP_MAX_AGE_HOURS are removed whenever a new one is built.
+MMAP_DIR = os.environ.get("APNAPAN_MMAP_DIR", os.path.join(tempfile.gettempdir(), "apnapan_mmap"))
+MMAP_MAX_AGE_HOURS = float(os.environ.get("APNAPAN_MMAP_MAX_AGE_HOURS", 24))
+MMAP_BLOCK_ROWS = 250_000
+MMAP_PREVIEW_ROWS = 100
+
+class MappedItemStore:
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        self.store_dir = store_dir
+        self.n_rows = meta["n_rows"]
+        self.item_columns = meta["item_columns"]
+        self.group_labels = meta["group_labels"]
+        self.group_columns = meta["group_columns"]
+        self.group_values = meta["group_values"]
+        self.items = self._open("items.bin", np.int8, len(self.item_columns))
+        self.codes = self._open("codes.bin", np.int32, len(self.group_labels))
+        self.preview = pd.read_csv(os.path.join(store_dir, "preview.csv"))
+
+    def _open(self, name, dtype, width):
+        shape = (self.n_rows, width)
+        if self.n_rows == 0 or width == 0:
+            return np.zeros(shape, dtype=dtype)  # an empty file cannot be mapped
+        return np.memmap(os.path.join(self.store_dir, name), dtype=dtype, mode="r", shape=shape)
+
+    @property
+    def disk_bytes(self):
+        return self.items.nbytes + self.codes.nbytes
+
+    def blocks(self):
+        for start in range(0, self.n_rows, MMAP_BLOCK_ROWS):
+            yield start, slice(start, start + MMAP_BLOCK_ROWS)
+
+    # Pages touch the store on every run, so pruning only removes stores nobody has opened for a while
+    def touch(self):
+        try:
+            os.utime(self.store_dir)
+        except OSError:
+            pass
+
+# Removes stores (and scratch directories of builds that died) last touched more than max_age_hours ago. A store
+# still mapped by another session keeps working on POSIX, as the open mappings outlive the deleted files.
+def prune_mapped_stores(mmap_dir, max_age_hours, keep):
+    cutoff = time.time() - max_age_hours * 3600
+    try:
+        entries = list(os.scandir(mmap_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            stale = entry.path != keep and entry.is_dir() and entry.stat().st_mtime < cutoff
+        except FileNotFoundError:
+            continue
+        if stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+# Questionnaire and demographic columns are resolved on the first chunk; later chunks are aligned to its columns.
+# Stores are keyed by upload fingerprint and written to a scratch directory first, so a finished store is reused
+# across sessions and restarts and a half-written one is never opened. A cancelled or failed build removes its
+# scratch directory.
+def build_mapped_store(job, uploaded_file, store_dir, group_columns, dictionary):
+    if not os.path.exists(os.path.join(store_dir, "meta.json")):
+        prune_mapped_stores(os.path.dirname(store_dir), MMAP_MAX_AGE_HOURS, keep=store_dir)
+        scratch_dir = f"{store_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(scratch_dir)
+        try:
+            write_mapped_store(job, uploaded_file, scratch_dir, group_columns, dictionary)
+        except BaseException:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            raise
+        try:
+            os.makedirs(os.path.dirname(store_dir), exist_ok=True)
+            os.rename(scratch_dir, store_dir)
+        except OSError:  # another session finished the same upload first
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    job.report(1.0)
+    return MappedItemStore(store_dir)
+
+def write_mapped_store(job, uploaded_file, scratch_dir, group_columns, dictionary):
+    columns = item_cols = group_items = None
+    lookups = []
+    n_rows = 0
+    with open(os.path.join(scratch_dir, "items.bin"), "wb") as items_file, \
+            open(os.path.join(scratch_dir, "codes.bin"), "wb") as codes_file:
+        for chunk in iter_upload_chunks(uploaded_file):
+            job.report(min(uploaded_file.tell() / max(uploaded_file.size, 1), 0.99))
+            normalize_hinglish(chunk, dictionary)
+            if columns is None:
+                columns = list(chunk.columns)
+                chunk.head(MMAP_PREVIEW_ROWS).to_csv(os.path.join(scratch_dir, "preview.csv"), index=False)
+                item_cols = detect_questionnaire_cols(chunk)
+            else:
+                chunk = chunk.reindex(columns=columns)
+            cleaned = clean_survey_data(chunk, item_cols)
+            if group_items is None:
+                group_items = list(resolve_group_columns(cleaned, group_columns).items())
+                lookups = [{} for _ in group_items]
+
+            # Likert codes are small integers; anything outside 1..127 is stored as missing
+            values = cleaned[item_cols].to_numpy(dtype=np.float32)
+            values[~((values >= 1) & (values <= 127))] = 0
+            items_file.write(np.ascontiguousarray(values, dtype=np.int8).tobytes())
+
+            # Each chunk infers its own column types, so group values are coded by their text form
+            codes = np.full((len(cleaned), len(group_items)), -1, dtype=np.int32)
+            for g, (label, col) in enumerate(group_items):
+                chunk_codes, uniques = pd.factorize(column_as_text(cleaned[col]))
+                lookup = lookups[g]
+                remap = np.array([lookup.setdefault(value, len(lookup)) for value in uniques], dtype=np.int32)
+                codes[chunk_codes >= 0, g] = remap[chunk_codes[chunk_codes >= 0]]
+            codes_file.write(codes.tobytes())
+            n_rows += len(cleaned)
+
+    meta = {
+        "n_rows": n_rows,
+        "item_columns": item_cols or [],
+        "group_labels": [label for label, _ in group_items or []],
+        "group_columns": [col for _, col in group_items or []],
+        "group_values": [list(lookup) for lookup in lookups],
+    }
+    with open(os.path.join(scratch_dir, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file)
+
+# One blockwise pass over the store for the rows matching selection_codes ({group position: selected codes}):
+# overall score and construct averages as in masked_belonging_metrics, group means as in aggregate_all_groups,
+# and value counts per demographic. Only one block of rows is resident at a time.
+def aggregate_mapped_store(job, store, matched_positions, area_positions, selection_codes):
+    n_items = len(store.item_columns)
+    weights = np.zeros(n_items, dtype=np.float32)
+    for positions in matched_positions.values():
+        np.add.at(weights, positions, 1)
+    item_sums = np.zeros(n_items)
+    item_counts = np.zeros(n_items)
+    score_sum = 0.0
+    n_selected = 0
+    bins = [len(values) for values in store.group_values]
+    value_counts = [np.zeros(n_bins + 1, dtype=np.int64) for n_bins in bins]
+    group_sums = {(area, g): np.zeros(bins[g]) for area in area_positions for g in range(len(bins))}
+    group_counts = {key: np.zeros(bins[key[1]], dtype=np.int64) for key in group_sums}
+
+    for start, rows in store.blocks():
+        job.report(start / max(store.n_rows, 1))
+        codes = np.asarray(store.codes[rows])
+        mask = np.ones(len(codes), dtype=bool)
+        for g, selected in selection_codes.items():
+            mask &= np.isin(codes[:, g], selected)
+        codes = codes[mask]
+        values = np.asarray(store.items[rows])[mask].astype(np.float32)
+        answered = (values > 0).astype(np.float32)
+
+        item_sums += values.sum(axis=0)
+        item_counts += answered.sum(axis=0)
+        raw = values @ weights
+        count = answered @ weights
+        score_sum += float(np.divide(raw, count, out=np.zeros_like(raw), where=count > 0).sum())
+        n_selected += int(mask.sum())
+        for g in range(len(bins)):
+            value_counts[g] += np.bincount(codes[:, g] + 1, minlength=bins[g] + 1)
+        for area, position in area_positions.items():
+            has_answer = answered[:, position] > 0
+            for g in range(len(bins)):
+                valid = has_answer & (codes[:, g] >= 0)
+                group_counts[(area, g)] += np.bincount(codes[valid, g], minlength=bins[g])
+                group_sums[(area, g)] += np.bincount(codes[valid, g], weights=values[valid, position], minlength=bins[g])
+
+    if n_selected == 0:
+        return {"rows": 0, "overall": None, "category_averages": {}, "groups": {}, "value_counts": {}}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        column_means = item_sums / item_counts
+    category_averages = {
+        cat: pd.Series(column_means[positions]).mean() if positions else 0
+        for cat, positions in matched_positions.items()
+    }
+    groups = {}
+    for (area, g), counts in group_counts.items():
+        present = counts > 0
+        groups[(area, store.group_labels[g])] = pd.DataFrame({
+            store.group_columns[g]: np.asarray(store.group_values[g], dtype=object)[present],
+            "AvgScore": group_sums[(area, g)][present] / counts[present],
+            "Count": counts[present],
+        })
+    return {
+        "rows": n_selected,
+        "overall": score_sum / n_selected,
+        "category_averages": category_averages,
+        "groups": groups,
+        "value_counts": {
+            label: pd.DataFrame({label: [np.nan] + store.group_values[g], "Count": value_counts[g]})
+            .query("Count > 0").sort_values("Count", ascending=False).reset_index(drop=True)
+            for g, label in enumerate(store.group_labels)
+        },
+    }
+
 # Add a "Back" button to navigate to the landing page
 if st.button("Back to Landing Page", key="back_button"):
     navigate_to('landing')
@@ -281,28 +1650,176 @@ if st.session_state['current_page'] == 'main':
 
     # Existing main page content goes here
 # Upload Data with Drag-and-Drop
-uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx", "xls", "txt"])
+data_source = st.radio("Data source", ["Upload a file", "Google Sheet"], horizontal=True, key="data_source")
+if data_source == "Google Sheet":
+    # Responses come straight from a Form-linked Sheet; only rows added since the last sync are fetched
+    uploaded_file = None
+    response_sheets = allowed_response_sheets()
+    sheet_label = st.selectbox("Google Sheet", list(response_sheets), index=None, key="sheet_name")
+    if not response_sheets:
+        st.info("No Google Sheets are configured for this app. Ask the administrator to add them to [response_sheets].")
+    if sheet_label is not None:
+        sheet_name = response_sheets[sheet_label]
+        try:
+            source = sheet_response_source(sheet_name)
+            if st.button("Fetch new responses", key="sheet_refresh") or source.synced_at is None:
+                with perf_stage("sheet_sync") as stage:
+                    stage["rows"] = source.sync()
+                st.caption(f"{stage['rows']} new responses fetched.")
+            st.caption(f"{len(source.rows)} responses, last synced at {source.synced_at:%H:%M:%S}.")
+            if source.rows:
+                uploaded_file = source.as_upload()
+            else:
+                st.info("The Sheet has no responses yet.")
+        except Exception as e:
+            st.error(f"Could not read the Google Sheet: {e}")
+else:
+    uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx", "xls", "txt", "gz", "bz2", "xz", "zip"])
+use_mapped_backend = st.sidebar.toggle(
+    "Low-memory mode", value=False, key="toggle_mapped_backend",
+    help="For district-scale CSV files: answers are kept on disk and only the Insight Dashboard is shown."
+)
 
 
 if uploaded_file is not None:
+    # Fingerprint the raw upload so performance records can be grouped per dataset
+    with uploaded_file.getbuffer() as file_buffer:
+        st.session_state['dataset_fingerprint'] = hashlib.blake2b(file_buffer, digest_size=8).hexdigest()
+    session_id = st.session_state['session_id']
+    # The parsed and cleaned data live in the shared dataset_cache; this session only keeps references
+    if st.session_state.get('cached_dataset') != st.session_state['dataset_fingerprint']:
+        dataset_cache().release_session(session_id)
+        st.session_state['cached_dataset'] = st.session_state['dataset_fingerprint']
+
+# Low-memory mode: the dashboard is served from the memory-mapped store, one block of rows at a time
+if uploaded_file is not None and use_mapped_backend and upload_file_type(uploaded_file) in STREAMABLE_TYPES:
+    fingerprint = st.session_state['dataset_fingerprint']
+    store, store_job = cached_job_result(
+        ("mapped_store", fingerprint), "mapped_store", build_mapped_store,
+        uploaded_file, os.path.join(MMAP_DIR, fingerprint), GROUP_COLUMNS, hinglish_dictionary()
+    )
+    if store is None:
+        if store_job is None:
+            st.warning(f"You already have {MAX_JOBS_PER_SESSION} background jobs running. Please wait or cancel one.")
+        elif not store_job.done:
+            show_job_progress(store_job, "Writing the dataset to disk")
+        elif store_job.status == "cancelled":
+            st.info("Processing was cancelled. Upload the file again to restart.")
+        else:
+            st.error(f"Error processing file: {store_job.error}. Please upload a valid CSV file.")
+        st.stop()
+    store.touch()
+
+    st.write(
+        f"Low-memory mode: {store.n_rows} rows, {len(store.item_columns)} questions, "
+        f"{store.disk_bytes / 1024 ** 2:.1f} MB on disk"
+    )
+    st.write("### Data Preview")
+    st.dataframe(store.preview)
+
+    st.sidebar.header("Filter Students")
+    selection_codes = {}
+    for g, label in enumerate(store.group_labels):
+        selected_values = st.sidebar.multiselect(label, store.group_values[g], key=f"filter_{fingerprint}_{label}")
+        if selected_values:
+            selection_codes[g] = np.array([store.group_values[g].index(value) for value in selected_values], dtype=np.int32)
+
+    matched_positions = {
+        cat: [j for j, col in enumerate(store.item_columns) if any(k.lower() in col.lower() for k in keywords)]
+        for cat, keywords in BELONGING_QUESTIONS.items()
+    }
+    area_positions = {area: positions[0] for area, positions in matched_positions.items() if positions}
+    aggregates, aggregate_job = cached_job_result(
+        ("mapped_aggregates", fingerprint, tuple((g, tuple(codes)) for g, codes in selection_codes.items())),
+        "mapped_aggregation", aggregate_mapped_store, store, matched_positions, area_positions, selection_codes,
+        rows=store.n_rows
+    )
+
+    with st.expander("Click here for Insight Dashboard!", expanded=True):
+        st.header("Insight Dashboard")
+        st.write("### Key Metrics (Scale of 5)")
+        if aggregates is None:
+            if aggregate_job is None:
+                st.warning(f"You already have {MAX_JOBS_PER_SESSION} background jobs running. Please wait or cancel one.")
+            elif not aggregate_job.done:
+                show_job_progress(aggregate_job, "Scoring")
+            elif aggregate_job.status == "cancelled":
+                st.info("Scoring was cancelled. Change a filter to restart.")
+            else:
+                st.error(f"Scoring failed: {aggregate_job.error}")
+        elif aggregates["overall"] is None:
+            st.warning("No students match the selected filters.")
+        else:
+            if selection_codes:
+                st.caption(f"Filtered view: {aggregates['rows']} of {store.n_rows} students")
+            metric_cols = st.columns(4)
+            cards = [("Overall Belonging Score", aggregates["overall"]), *aggregates["category_averages"].items()]
+            for i, (label, value) in enumerate(cards):
+                metric_cols[i % 4].metric(label, f"{value:.2f}")
+
+            st.subheader("Demographic Overview")
+            pie_cols = st.columns(2)
+            for i, (label, value_counts) in enumerate(aggregates["value_counts"].items()):
+                fig = px.pie(value_counts, names=label, values="Count", title=f"{label} Distribution", hole=0.3)
+                pie_cols[i % 2].plotly_chart(fig, use_container_width=True)
+
+            if area_positions:
+                st.subheader("Belonging Across Groups")
+                selected_area = st.selectbox("Select a belonging construct", list(area_positions), key="mapped_area")
+                bar_cols = st.columns(2)
+                for g, label in enumerate(store.group_labels):
+                    group_avg = aggregates["groups"][(selected_area, label)]
+                    group_col = store.group_columns[g]
+                    fig = px.bar(
+                        group_avg,
+                        x=group_col,
+                        y="AvgScore",
+                        text="Count",
+                        title=f"{selected_area} by {label}",
+                        labels={group_col: label, "AvgScore": "Avg Score"},
+                        height=400,
+                        color=group_col,
+                        color_discrete_sequence=px.colors.qualitative.Set3
+                    )
+                    fig.update_traces(texttemplate='N=%{text}', textposition='inside', insidetextanchor='middle')
+                    bar_cols[g % 2].plotly_chart(fig, use_container_width=True)
+
+elif uploaded_file is not None:
+    if use_mapped_backend:
+        st.sidebar.caption("Low-memory mode supports CSV and TXT files (optionally compressed or zipped) only.")
+    raw_key = ("raw", st.session_state['dataset_fingerprint'])
+
     # Determine file type and read accordingly
-    file_type = uploaded_file.name.split('.')[-1].lower()
     try:
-        if file_type in ["csv", "txt"]:
-            stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            df = pd.read_csv(stringio)
-        elif file_type in ["xlsx", "xls"]:
-            df = pd.read_excel(uploaded_file)
-        else:
-            st.error("Unsupported file format. Please upload a CSV, TXT, XLS, or XLSX file.")
-            st.stop()
+        df = dataset_cache().get(raw_key, session_id)
+        if df is None:
+            with perf_stage("parse") as stage:
+                df = read_uploaded_file(uploaded_file)
+                if df is None:
+                    st.error("Unsupported file format. Please upload a CSV, TXT, XLS or XLSX file, "
+                             "optionally compressed (.gz, .bz2, .xz) or in a .zip archive.")
+                    st.stop()
+                stage["rows"] = len(df)
+            with perf_stage("normalize", rows=len(df)):
+                df.attrs["normalized"] = normalize_hinglish(df, hinglish_dictionary())
+            dataset_cache().put(raw_key, df, session_id)
 
         # Automatically remove timestamp-like columns
         timestamp_keywords = ['timestamp', 'date', 'time', 'created', 'submitted', 'record', 'entry', 'logged']
         timestamp_cols = [col for col in df.columns if any(keyword in col.lower() for keyword in timestamp_keywords)]
+        submission_times = None
         if timestamp_cols:
+            # Submission times are parsed once per upload and kept for the trends panel
+            with perf_stage("submission_times", rows=len(df)):
+                submission_times = dataset_cache().get_or_compute(
+                    ("submission_times", st.session_state['dataset_fingerprint']), session_id,
+                    lambda: parse_submission_times(df, timestamp_cols)
+                )
             df = df.drop(columns=timestamp_cols)
             st.write(f"Removed timestamp columns: {', '.join(timestamp_cols)}")
+        normalized_headers, normalized_values = df.attrs.get("normalized", (0, 0))
+        if normalized_headers or normalized_values:
+            st.write(f"Translated Hindi/Hinglish terms in {normalized_headers} column names and {normalized_values} distinct answers.")
 
         # Display file details
         #st.write(f"File uploaded: {uploaded_file.name}")
@@ -321,81 +1838,76 @@ if uploaded_file is not None:
         with st.expander("Data Cleaning Options"):
             pass  # Removed duplicate rows and missing values options
 
-        if 'df_cleaned' not in st.session_state:
-            st.session_state['df_cleaned'] = df.copy()  # Initialize
-
     except Exception as e:
-        st.error(f"Error processing file: {str(e)}. Please upload a valid CSV, TXT, XLS, or XLSX file.")
+        st.error(f"Error processing file: {str(e)}. Please upload a valid CSV, TXT, XLS or XLSX file, or a compressed or zipped CSV.")
         st.stop()
     
     # Detect questionnaire columns dynamically
-    questionnaire_cols = [col for col in df.columns if any(str(val).strip().title() in questionnaire_mapping for val in df[col].dropna())]
+    with perf_stage("questionnaire_detection", rows=len(df)):
+        questionnaire_cols = dataset_cache().get_or_compute(
+            ("questionnaire_cols", st.session_state['dataset_fingerprint']), session_id, lambda: detect_questionnaire_cols(df)
+        )
+
+    group_columns = GROUP_COLUMNS
 
     #st.write("### Suggested Actions:")
-    fill_method = True # st.selectbox("Handle missing values", ["None", "Mean", "Median", "Drop"])
     convert_questionnaire = True #st.checkbox("Convert Questionnaire Responses to Numeric", value=True)
     
     #if st.button("Apply Suggested Cleaning"):
-    df_cleaned = df.copy()
-
-    # #attempt to translate the column names, unable to get hands on a hinglish set 
-
-    # # Initialize the Translator
-    # translator = Translator()
-
-    # # Create a function to translate column names
-    # def translate_columns(columns):
-    #     translated_column = []
-    #     for text in columns:
-    #       try:
-    #         # Translate each column name from Hinglish/ to English
-    #         translated = translator.translate(col, src='hi', dest='en').text
-    #         translated_column.append(translated.text)
-    #       except Exception as e:
-    #         print(f"Error translating text '{text}': {e}")
-    #         translated_column.append(text) 
-    #     return translated_column
-
-    # # Apply translation to all columns or specific columns
-    # for col in df.columns:
-    #   df_cleaned[col] = translate_columns(df[col])
-
-    # print("\nTranslated DataFrame:")
-    # print(df_cleaned)
         
-    if convert_questionnaire and questionnaire_cols:
-        for col in questionnaire_cols:
-            df_cleaned[col] = df_cleaned[col].astype(str).str.strip().str.title()
-            df_cleaned[col] = df_cleaned[col].map(questionnaire_mapping).fillna(df_cleaned[col])
-            df_cleaned[col] = pd.to_numeric(df_cleaned[col], errors='coerce')
-    else:
+    if not (convert_questionnaire and questionnaire_cols):
         st.info("No questionnaire columns found to convert.")
+        questionnaire_cols = []
 
-    ethnicity_column = next((col for col in df_cleaned.columns if "ethnicity" in col.lower()), None)
-    if ethnicity_column:
-        df_cleaned["ethnicity_cleaned"] = df_cleaned[ethnicity_column].replace({
-            v: "General" if "general" in str(v).lower() else
-            "SC" if "sc" in str(v).lower() else
-            "OBC" if "other" in str(v).lower() else
-            "Don't Know" if "do" in str(v).lower() else
-            "ST" if "st" in str(v).lower() else v
-            for v in df_cleaned[ethnicity_column]
-        })
+    provisional = False
+    cleaned_key = ("cleaned", st.session_state['dataset_fingerprint'])
+    if len(df) >= PROGRESSIVE_MIN_ROWS:
+        df_cleaned, progressive_job = cached_job_result(
+            cleaned_key, "full_cleaning", clean_in_chunks, df, questionnaire_cols, rows=len(df)
+        )
+        if df_cleaned is None:
+            provisional = True
+            partial_parts = progressive_job.partial if progressive_job is not None else None
+            if progressive_job is None:
+                st.warning(f"You already have {MAX_JOBS_PER_SESSION} background jobs running. Showing sample results only.")
+            elif not progressive_job.done:
+                show_job_progress(progressive_job, "Processing the full dataset in the background", partial_parts)
+            elif progressive_job.status == "cancelled":
+                st.info("Processing of the full dataset was cancelled. Showing sample results only.")
+                if st.button("Restart full processing", key="restart_cleaning"):
+                    get_or_submit_job(
+                        cleaned_key, "full_cleaning", clean_in_chunks, df, questionnaire_cols, rows=len(df), restart=True
+                    )
+                    st.rerun()
+            else:
+                st.error(f"Processing the full dataset failed: {progressive_job.error}. Showing sample results only.")
+            if partial_parts:
+                provisional_variant = f":partial{len(partial_parts)}"
+                with perf_stage("cleaning", rows=sum(len(part) for part in partial_parts)):
+                    df_cleaned = dataset_cache().get_or_compute(
+                        ("cleaned", st.session_state['dataset_fingerprint'] + provisional_variant), session_id,
+                        lambda: pd.concat(partial_parts)
+                    )
+                st.info(f"Provisional results based on a random sample of {len(df_cleaned)} of {len(df)} rows "
+                        "processed so far. They are refined as processing continues and replaced by the exact "
+                        "results when it completes.")
+            else:
+                provisional_variant = ":sample"
+                strata_cols = [col for label, col in resolve_group_columns(df, group_columns).items() if label in ("Gender", "Grade")]
+                with perf_stage("cleaning", rows=PROGRESSIVE_SAMPLE_ROWS):
+                    df_cleaned = dataset_cache().get_or_compute(
+                        ("cleaned", st.session_state['dataset_fingerprint'] + provisional_variant), session_id,
+                        lambda: clean_survey_data(stratified_sample(df, strata_cols, PROGRESSIVE_SAMPLE_ROWS), questionnaire_cols)
+                    )
+                st.info(f"Provisional results based on a stratified sample of {len(df_cleaned)} of {len(df)} rows. "
+                        "They will be replaced by the exact results when processing completes.")
+    else:
+        with perf_stage("cleaning", rows=len(df)):
+            df_cleaned = dataset_cache().get_or_compute(cleaned_key, session_id, lambda: clean_survey_data(df, questionnaire_cols))
+    # Shallow copy: columns added below must not leak into the shared entry
+    df_cleaned = df_cleaned.copy(deep=False)
+    provisional_label = " (provisional)" if provisional else ""
 
-    # if fill_method != "None":
-    #     if st.button(f"Approve {fill_method} for missing values?"):
-    #         if fill_method == "Mean" or fill_method == "Median":
-    #             numeric_cols = df_cleaned.select_dtypes(include=['float64', 'int64']).columns
-    #             if numeric_cols.empty:
-    #                 st.warning("No numeric columns available for mean/median imputation.")
-    #             else:
-    #                 if fill_method == "Mean":
-    #                     df_cleaned[numeric_cols] = df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].mean())
-    #                 elif fill_method == "Median":
-    #                     df_cleaned[numeric_cols] = df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].median())
-    #         elif fill_method == "Drop":
-    #             df_cleaned = df_cleaned.dropna()
-    st.session_state['df_cleaned'] = df_cleaned
     # st.write("### Data Preview (After Cleaning)")
     # col1, col2 = st.columns([8, 2])
     # with col1:
@@ -405,21 +1917,11 @@ if uploaded_file is not None:
     #st.write(f"Number of question columns used for Insights: {len(questionnaire_cols)}")
 
     # Insight Delivery
-    df_cleaned = st.session_state.get('df_cleaned', df)
-
-    belonging_questions = {
-        "Safety": ["safe", "surakshit"],
-        "Respect": ["respected", "izzat", "as much respect"],        
-        "Welcome": ["being welcomed", "welcome", "swagat"],
-        "Relationships with Teachers": ["one teacher", "share your problem", "care about your feelings", "close to your teachers"],
-        "Participation": ["opportunities", "participate", "school activities", "take part"],        
-        "Acknowledgement": ["notice", "noticed", "listen to you", "dekhein", "acknowledge", "recognized", "valued", "heard", "seen", "like you"]
-    }
 
     #  Match each category to actual question columns
     matched_questions = {
         cat: [col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in keywords)]
-        for cat, keywords in belonging_questions.items()
+        for cat, keywords in BELONGING_QUESTIONS.items()
     }
 
     kaash_col = [col for col in df_cleaned.columns if "kaash" in col.lower()]
@@ -428,12 +1930,13 @@ if uploaded_file is not None:
     # Belonging score with error handling
     belonging_cols = [col for sublist in matched_questions.values() for col in sublist]
     if belonging_cols:
-        df_cleaned["BelongingRaw"] = df_cleaned[belonging_cols].apply(pd.to_numeric, errors="coerce").sum(axis=1)
-        df_cleaned["BelongingCount"] = df_cleaned[belonging_cols].apply(pd.to_numeric, errors="coerce").notna().sum(axis=1)
-        df_cleaned["BelongingScore"] = df_cleaned.apply(
-            lambda row: (row["BelongingRaw"] - row["KaashScore"]) / row["BelongingCount"] if row["BelongingCount"] > 0 else 0,
-            axis=1
-        )
+        with perf_stage("belonging_score", rows=len(df_cleaned)):
+            df_cleaned["BelongingRaw"] = df_cleaned[belonging_cols].apply(pd.to_numeric, errors="coerce").sum(axis=1)
+            df_cleaned["BelongingCount"] = df_cleaned[belonging_cols].apply(pd.to_numeric, errors="coerce").notna().sum(axis=1)
+            answered_count = df_cleaned["BelongingCount"].where(df_cleaned["BelongingCount"] > 0)
+            df_cleaned["BelongingScore"] = ((df_cleaned["BelongingRaw"] - df_cleaned["KaashScore"]) / answered_count).where(
+                df_cleaned["BelongingCount"] > 0, 0
+            )
     else:
         df_cleaned["BelongingRaw"] = 0
         df_cleaned["BelongingCount"] = 0
@@ -452,38 +1955,125 @@ if uploaded_file is not None:
         valid_categories = {k: v for k, v in category_averages.items() if v > 0.00}
         lowest_area = min(valid_categories, key=valid_categories.get) if valid_categories else None
 
-    group_columns = {
-        "Gender": ["gender", "What gender do you use"],
-        "Grade": ["grade", "Which grade are you in"],
-        "Income Status": ["Income Category"],
-        "Health Condition": ["disability", "health condition"],
-        "Ethnicity": ["ethnicity_cleaned"],
-        "Religion": ["religion"]
-    }
+    # Drill-down filters: any combination of demographic values, intersected from precomputed per-value masks
+    # Cached arrays are keyed per dataset variant, so provisional samples never share entries with the full file
+    dataset_fingerprint = st.session_state['dataset_fingerprint'] + (provisional_variant if provisional else "")
+    with perf_stage("demographic_index", rows=len(df_cleaned)):
+        group_column_items = tuple(resolve_group_columns(df_cleaned, group_columns).items())
+        demographic_index = dataset_cache().get_or_compute(
+            ("demographics", dataset_fingerprint, group_column_items), session_id,
+            lambda: build_demographic_index(df_cleaned, group_column_items)
+        )
+    st.sidebar.header("Filter Students")
+    # Widgets are keyed on the upload, not the dataset variant, so selections survive provisional refinements and the
+    # switch to exact results; values the current rows no longer have are dropped
+    filter_selections = {}
+    for label, entry in demographic_index.items():
+        widget_key = f"filter_{st.session_state['dataset_fingerprint']}_{label}"
+        if widget_key in st.session_state:
+            st.session_state[widget_key] = [value for value in st.session_state[widget_key] if value in entry["values"]]
+        filter_selections[label] = st.sidebar.multiselect(label, entry["values"], key=widget_key)
+    filter_mask = intersect_filters(demographic_index, filter_selections, len(df_cleaned))
+
+    # Response-quality screening: flagged rows can be excluded from every metric and chart through filter_mask
+    quality_flags = {}
+    if questionnaire_cols:
+        with perf_stage("quality_screening", rows=len(df_cleaned)):
+            quality_flags = dataset_cache().get_or_compute(
+                ("quality", dataset_fingerprint, tuple(questionnaire_cols)), session_id,
+                lambda: screen_response_quality(
+                    df_cleaned[list(df.columns)], questionnaire_cols, [entry["column"] for entry in demographic_index.values() if entry["column"] in df.columns]
+                )
+            )
+    excluded_flags = []
+    with st.expander("Response Quality Check"):
+        if quality_flags:
+            any_flag = np.logical_or.reduce(list(quality_flags.values()))
+            st.dataframe(pd.DataFrame({
+                "Check": list(quality_flags) + ["Any flag"],
+                "Rows Flagged": [int(flags.sum()) for flags in quality_flags.values()] + [int(any_flag.sum())],
+                "Percent": [round(100 * flags.mean(), 1) for flags in quality_flags.values()] + [round(100 * any_flag.mean(), 1)],
+            }), hide_index=True)
+            st.caption(f"Straight-lining: same answer to every question ({STRAIGHTLINE_MIN_ITEMS}+ answered). "
+                       f"Too few answers: under {MIN_ANSWERED_FRACTION:.0%} of questions answered. "
+                       "Near duplicate: same answers and demographics as an earlier row.")
+            excluded_flags = [
+                flag for flag in quality_flags
+                if st.checkbox(f"Exclude rows flagged '{flag}'", value=False, key=f"exclude_{flag}")
+            ]
+        else:
+            st.write("No questionnaire columns to screen.")
+    for flag in excluded_flags:
+        filter_mask &= ~quality_flags[flag]
+
+    # Missing data: fill the Likert matrix in place (one float32 copy per strategy, cached) or drop sparse rows.
+    # df_answers keeps the answers as given, for statistics that must not see imputed values.
+    df_answers = df_cleaned.copy(deep=False)
+    missing_settings = ("None",)
+    with st.expander("Missing Data Handling"):
+        missing_strategy = st.selectbox("Handle missing answers", MISSING_STRATEGIES, key="missing_strategy")
+        if missing_strategy == "Group mean":
+            group_label = st.selectbox("Group used for the mean", list(demographic_index), key="missing_group")
+            missing_settings = (missing_strategy, group_label)
+        elif missing_strategy == "Drop below threshold":
+            min_answered = st.slider("Minimum share of questions answered", 0, 100, 50, step=5, format="%d%%", key="missing_threshold")
+            missing_settings = (missing_strategy, min_answered)
+        else:
+            missing_settings = (missing_strategy,)
+
+        if not questionnaire_cols or missing_strategy == "None":
+            pass
+        elif missing_strategy == "Drop below threshold":
+            answered_share = df_cleaned[questionnaire_cols].notna().to_numpy().mean(axis=1)
+            dropped = answered_share < missing_settings[1] / 100
+            filter_mask &= ~dropped
+            st.write(f"Rows dropped: {int(dropped.sum())} of {len(df_cleaned)}")
+        elif missing_strategy == "Group mean" and missing_settings[1] is None:
+            st.info("No demographic columns available for group means.")
+        else:
+            column_position = {col: j for j, col in enumerate(questionnaire_cols)}
+            construct_members = [
+                np.array([column_position[col] for col in cols if col in column_position])
+                for cols in matched_questions.values()
+            ]
+            construct_members = [members for members in construct_members if len(members)]
+            group_codes = demographic_index[missing_settings[1]]["codes"] if missing_strategy == "Group mean" else None
+            with perf_stage("missing_data", rows=len(df_cleaned)):
+                imputation = dataset_cache().get_or_compute(
+                    ("imputed", dataset_fingerprint, tuple(questionnaire_cols), missing_settings), session_id,
+                    lambda: build_imputed_matrix(df_cleaned, questionnaire_cols, missing_strategy, construct_members, group_codes)
+                )
+                for j, col in enumerate(questionnaire_cols):
+                    df_cleaned[col] = imputation["values"][:, j]
+            imputed_report = pd.DataFrame({"Question": questionnaire_cols, "Values Imputed": imputation["imputed"]})
+            st.write(f"Values imputed: {int(imputation['imputed'].sum())}")
+            st.dataframe(imputed_report[imputed_report["Values Imputed"] > 0], hide_index=True)
+    # Everything cached downstream of the item values depends on the missing-data settings
+    analysis_fingerprint = dataset_fingerprint + ":" + "|".join(map(str, missing_settings))
+
+    filter_key = (
+        tuple((label, tuple(map(str, values))) for label, values in filter_selections.items() if values),
+        tuple(excluded_flags),
+        missing_settings
+    )
+    filters_active = any(filter_selections.values()) or bool(excluded_flags) or missing_settings[0] == "Drop below threshold"
+    if filters_active:
+        st.sidebar.caption(f"Showing {int(filter_mask.sum())} of {len(df_cleaned)} students")
 
     with st.expander("Click here for Insight Dashboard!"):
         st.header("Insight Dashboard")
         st.write("### Key Metrics (Scale of 5)")
+        if provisional:
+            st.caption("Provisional: computed on a sample while the full file is processed.")
         show_dashboard = st.toggle("Show Metrics Board", value=True, key="toggle_dashboard")
         if show_dashboard:
-            # Ensure df_cleaned is available
-            df_cleaned = st.session_state.get('df_cleaned', pd.DataFrame())
-            
             # Initialize variables with default values
             overall_belonging_score = None
             category_averages = {}
+            item_arrays = None
             highest_area = None
             lowest_area = None
-            
-            belonging_questions = {
-            "Safety": ["safe", "surakshit"],
-            "Respect": ["respected","respect", "izzat", "as much respect"],        
-            "Welcome": ["being welcomed", "welcome", "swagat"],
-            "Relationships with Teachers": ["one teacher", "share your problem", "care about your feelings", "close to your teachers", "close teacher"],
-            "Participation": ["opportunities", "participate", "school activities", "take part"],        
-            "Acknowledgement": ["notice", "noticed", "listen to you", "dekhein", "acknowledge", "recognized", "valued", "heard", "seen", "like you"]
-            }
-            
+
 
             # Recalculate matched_questions and related metrics if data is available
             if df_cleaned.empty:
@@ -491,8 +2081,11 @@ if uploaded_file is not None:
             else:
                 matched_questions = {
                     cat: [col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in keywords)]
-                    for cat, keywords in belonging_questions.items()
+                    for cat, keywords in BELONGING_QUESTIONS.items()
                 }
+                belonging_cols = [col for sublist in matched_questions.values() for col in sublist]
+                item_key = ("items", analysis_fingerprint, tuple(dict.fromkeys(belonging_cols)), tuple(belonging_cols))
+
                 # Add toggle for matched questions table
                 show_matched_questions = st.toggle("Show Questions matched to Constructs", value=False, key="toggle_matched_questions")
                 if show_matched_questions:
@@ -502,25 +2095,49 @@ if uploaded_file is not None:
                     matched_questions_df = matched_questions_df.apply(lambda x: "\n".join(x) if x.dtype == "object" and any(isinstance(val, list) for val in x) else x)
                     st.dataframe(matched_questions_df)
 
-                belonging_cols = [col for sublist in matched_questions.values() for col in sublist]
-                
+                    # Do the matched questions hang together? Computed on all responses as given, once per dataset:
+                    # imputed values would shrink item variances, so the missing-data settings are not part of the key
+                    if belonging_cols:
+                        with perf_stage("reliability", rows=len(df_answers)):
+                            reliability = dataset_cache().get_or_compute(
+                                (
+                                    "reliability", dataset_fingerprint,
+                                    tuple((cat, tuple(cols)) for cat, cols in matched_questions.items())
+                                ),
+                                session_id,
+                                lambda: construct_reliability(
+                                    build_item_arrays(df_answers, item_key[2], item_key[3]), matched_questions
+                                )
+                            )
+                        st.write("### Construct Reliability")
+                        st.dataframe(reliability["constructs"], hide_index=True)
+                        st.dataframe(reliability["items"], hide_index=True)
+                        st.caption(
+                            f"Alpha below {RELIABILITY_MIN_ALPHA} suggests the questions do not measure one construct. "
+                            f"Review questions with an item-total correlation below {RELIABILITY_MIN_ITEM_TOTAL} "
+                            "or whose removal would raise alpha."
+                        )
+
                 if belonging_cols:
-                    df_cleaned["BelongingRaw"] = df_cleaned[belonging_cols].apply(pd.to_numeric, errors="coerce").sum(axis=1)
-                    df_cleaned["BelongingCount"] = df_cleaned[belonging_cols].apply(pd.to_numeric, errors="coerce").notna().sum(axis=1)
-                    df_cleaned["BelongingScore"] = df_cleaned.apply(
-                        lambda row: (row["BelongingRaw"] / row["BelongingCount"]) if row["BelongingCount"] > 0 else 0,
-                        axis=1
-                    )
-                    overall_belonging_score = df_cleaned["BelongingScore"].mean()
-                    
-                    category_averages = {
-                        cat: df_cleaned[cols].apply(pd.to_numeric, errors='coerce').mean().mean() if cols else 0
-                        for cat, cols in matched_questions.items()
-                    }
-                    highest_area = max(category_averages, key=category_averages.get)
-                    # Filter out scores <= 0.00 for lowest score
-                    valid_categories = {k: v for k, v in category_averages.items() if v > 0.00}
-                    lowest_area = min(valid_categories, key=valid_categories.get) if valid_categories else None
+                    with perf_stage("dashboard_metrics", rows=int(filter_mask.sum())):
+                        item_arrays = dataset_cache().get_or_compute(
+                            item_key, session_id, lambda: build_item_arrays(df_cleaned, item_key[2], item_key[3])
+                        )
+                        df_cleaned["BelongingRaw"] = item_arrays["raw"]
+                        df_cleaned["BelongingCount"] = item_arrays["count"]
+                        df_cleaned["BelongingScore"] = item_arrays["score"]
+                        overall_belonging_score, category_averages = masked_belonging_metrics(
+                            item_arrays, matched_questions, filter_mask
+                        )
+                    if category_averages:
+                        highest_area = max(category_averages, key=category_averages.get)
+                        # Filter out scores <= 0.00 for lowest score
+                        valid_categories = {k: v for k, v in category_averages.items() if v > 0.00}
+                        lowest_area = min(valid_categories, key=valid_categories.get) if valid_categories else None
+                    else:
+                        st.warning("No students match the selected filters.")
+                    if filters_active:
+                        st.caption(f"Filtered view: {int(filter_mask.sum())} of {len(df_cleaned)} students")
                 else:
                     st.info("No survey columns matched the keyword categories to calculate scores.")
 
@@ -543,7 +2160,7 @@ if uploaded_file is not None:
                     st.markdown(f"""
                         <div style="background-color:#e6b0aa; border: 4px solid #ff9999; border-radius:10px; padding:1rem; text-align:center;
                                     box-shadow: 0 2px 5px rgba(0,0,0,0.1); color:black; height: 120px; display: flex; flex-direction: column; justify-content: center;">
-                            <h4> &#9734; Overall Belonging Score</h4>
+                            <h4> &#9734; Overall Belonging Score{provisional_label}</h4>
                             <h4 style="margin:0;">{overall_belonging_score:.2f}</h4>
                         </div>
                     """, unsafe_allow_html=True)
@@ -642,36 +2259,55 @@ if uploaded_file is not None:
             #         st.dataframe(pd.DataFrame.from_dict(category_averages, orient="index", columns=["Average Score"]).round(2))
 
             if not df_cleaned.empty:
-                summary = df_cleaned.describe()
                 col1, col2 = st.columns([8, 2])
                 with col1:
                     show_summary = st.toggle("Show Summary Table", value=False, key="toggle_summary")
                 if show_summary:
-                    st.dataframe(summary)
+                    st.dataframe(df_cleaned[filter_mask].describe() if filters_active else df_cleaned.describe())
+
+            # Driver analysis: how the constructs relate to each other and to the overall Belonging Score
+            if item_arrays is not None and category_averages:
+                col1, col2 = st.columns([8, 2])
+                with col1:
+                    show_drivers = st.toggle("Show Driver Analysis", value=False, key="toggle_drivers")
+                if show_drivers:
+                    with perf_stage("driver_analysis", rows=int(filter_mask.sum())):
+                        drivers = dataset_cache().get_or_compute(
+                            ("drivers", item_key, tuple((cat, tuple(cols)) for cat, cols in matched_questions.items()),
+                             filter_key),
+                            session_id, lambda: driver_analysis(item_arrays, matched_questions, filter_mask)
+                        )
+                    st.subheader(f"Key Drivers of Belonging{provisional_label}")
+                    if np.isnan(drivers["r_squared"]):
+                        st.info("Not enough complete responses to estimate the drivers of Belonging.")
+                    else:
+                        st.write(f"Regression of Belonging Score on the construct scores "
+                                 f"(N = {drivers['n_complete']}, R² = {drivers['r_squared']:.2f})")
+                    st.dataframe(drivers["drivers"], hide_index=True)
+
+                    show_items = st.toggle("Include individual questions", value=False, key="toggle_driver_items")
+                    positions = np.arange(len(drivers["labels"])) if show_items else np.append(drivers["construct_pos"], len(drivers["labels"]) - 1)
+                    labels = [label if len(label) <= 40 else label[:37] + "..." for label in np.array(drivers["labels"], dtype=object)[positions]]
+                    fig = px.imshow(
+                        drivers["corr"][np.ix_(positions, positions)],
+                        x=labels,
+                        y=labels,
+                        zmin=-1,
+                        zmax=1,
+                        color_continuous_scale="RdBu",
+                        text_auto=".2f" if not show_items else False,
+                        title="Correlation Matrix (pairwise complete)",
+                        height=500 if not show_items else max(500, 18 * len(positions))
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
 
         # Explore and Customize
+    # Charts shown below are collected as (section, charts per row, figure JSON) for the PDF report
+    report_figures = []
     with st.expander("Click here to explore Belonging Across Groups!"):
         st.subheader("Compare How Different Student Groups Experience Belonging")
         show_explore = st.toggle("Show Charts", value=True, key="toggle_explore")
         if show_explore and not df_cleaned.empty:
-            def categorize_income(possessions: str) -> str:
-                if pd.isna(possessions):
-                    return "Unknown"
-                items = possessions.lower()
-                has_car = "car" in items
-                has_computer = "computer" in items or "laptop" in items
-                has_home = "apna ghar" in items
-                is_rented = "rent" in items
-                if has_car and has_home:
-                    return "High"
-                if has_computer or (has_home and not has_car):
-                    return "Mid"
-                return "Low"
-
-            possessions_col = next((col for col in df_cleaned.columns if "what items among these do you have at home".lower() in col.lower()), None)
-            if possessions_col:
-                df_cleaned["Income Category"] = df_cleaned[possessions_col].apply(categorize_income)
-
             st.subheader(" Demographic Overview")
             demographic_cols = {
                 "Gender": ["gender", "What gender do you use"],
@@ -680,70 +2316,69 @@ if uploaded_file is not None:
                 "Ethnicity": ["ethnicity_cleaned"]
             }
 
-            demographic_data = {}
-            for label, keywords in demographic_cols.items():
-                matched_col = next((col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in keywords)), None)
-                if matched_col:
-                    demographic_data[label] = matched_col
-
-            if demographic_data:
-                items = list(demographic_data.items())
-
-                for row_i in range(0, len(items), 2):
-                    row = st.columns(2)
-
-                    for col_i in range(2):
-                        idx = row_i + col_i
-                        if idx >= len(items):
-                            break
-
-                        label, col_name = items[idx]
-                        col = row[col_i]
-
-                        value_counts = df_cleaned[col_name].value_counts(dropna=False).rename_axis(label).reset_index(name='Count')
-                        fig = px.pie(
-                            value_counts,
-                            names=label,
-                            values='Count',
-                            title=f"{label} Distribution",
-                            hole=0.3
-                        )
+            # Same keywords as group_columns, so the precomputed demographic index already covers these columns
+            demographic_data = {label: demographic_index[label] for label in demographic_cols if label in demographic_index}
 
-                        num_categories = len(value_counts)
-                        if num_categories > 3 or any(len(str(cat)) > 8 for cat in value_counts[label]):
-                            fig.update_traces(
-                                textposition='outside',
-                                textinfo='percent',
-                                textfont=dict(size=15),
-                                marker=dict(line=dict(color='#000000', width=1))
-                            )
-                        else:
-                            fig.update_traces(
-                                textposition='auto',
-                                textinfo='percent',
-                                textfont=dict(size=15)
+            with perf_stage("demographic_charts", rows=len(df_cleaned)):
+                if demographic_data:
+                    items = list(demographic_data.items())
+
+                    for row_i in range(0, len(items), 2):
+                        row = st.columns(2)
+
+                        for col_i in range(2):
+                            idx = row_i + col_i
+                            if idx >= len(items):
+                                break
+
+                            label, entry = items[idx]
+                            col = row[col_i]
+
+                            value_counts = masked_value_counts(entry, filter_mask, label)
+                            fig = px.pie(
+                                value_counts,
+                                names=label,
+                                values='Count',
+                                title=f"{label} Distribution{provisional_label}",
+                                hole=0.3
                             )
 
-                        fig.update_layout(
-                            uniformtext_minsize=7,
-                            margin=dict(t=45, b=45, l=45, r=45),
-                            height=400,
-                            width=400,
-                            showlegend=True
-                        )
+                            num_categories = len(value_counts)
+                            if num_categories > 3 or any(len(str(cat)) > 8 for cat in value_counts[label]):
+                                fig.update_traces(
+                                    textposition='outside',
+                                    textinfo='percent',
+                                    textfont=dict(size=15),
+                                    marker=dict(line=dict(color='#000000', width=1))
+                                )
+                            else:
+                                fig.update_traces(
+                                    textposition='auto',
+                                    textinfo='percent',
+                                    textfont=dict(size=15)
+                                )
 
-                        config = {
-                            'displayModeBar': True,
-                            'modeBarButtonsToAdd': ['zoom2d', 'autoScale2d', 'resetScale2d', 'toImage'],
-                            'toImageButtonOptions': {
-                                'format': 'png',
-                                'filename': f'{label}_distribution',
-                                'height': 500,
-                                'width': 700
+                            fig.update_layout(
+                                uniformtext_minsize=7,
+                                margin=dict(t=45, b=45, l=45, r=45),
+                                height=400,
+                                width=400,
+                                showlegend=True
+                            )
+
+                            config = {
+                                'displayModeBar': True,
+                                'modeBarButtonsToAdd': ['zoom2d', 'autoScale2d', 'resetScale2d', 'toImage'],
+                                'toImageButtonOptions': {
+                                    'format': 'png',
+                                    'filename': f'{label}_distribution',
+                                    'height': 500,
+                                    'width': 700
+                                }
                             }
-                        }
 
-                        col.plotly_chart(fig, use_container_width=True, config=config)
+                            col.plotly_chart(fig, use_container_width=True, config=config)
+                            report_figures.append(("Demographic Overview", 2, fig.to_json()))
 
 
             st.write("### Food for Thought")
@@ -760,9 +2395,10 @@ if uploaded_file is not None:
 
 
 
-            selected_area = st.selectbox("Which belonging aspect do you want to explore?", list(belonging_questions.keys()))
+            target_col = None
+            selected_area = st.selectbox("Which belonging aspect do you want to explore?", list(BELONGING_QUESTIONS.keys()))
             if selected_area and not df_cleaned.empty:
-                area_keywords = belonging_questions[selected_area]
+                area_keywords = BELONGING_QUESTIONS[selected_area]
                 matched_cols = [col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in area_keywords)]
                 if not matched_cols:
                     st.warning("No matching questions found for this aspect.")
@@ -777,14 +2413,7 @@ if uploaded_file is not None:
                     col_slots = [col1, col2]
                     chart_index = 0
 
-                    group_columns = {
-                        "Gender": ["gender", "What gender do you use"],
-                        "Grade": ["grade", "Which grade are you in"],
-                        "Income Status": ["Income Category"],
-                        "Health Condition": ["disability", "health condition"],
-                        "Ethnicity": ["ethnicity_cleaned"],
-                        "Religion": ["religion"]
-                    }
+                    group_columns = GROUP_COLUMNS
                     
                     # Gave a white box that looked unclean in most charts 
                     # st.markdown(   
@@ -837,97 +2466,124 @@ if uploaded_file is not None:
                     )
 
 
-                    for label, keywords in group_columns.items():
-                        matched_group_col = next((col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in keywords)), None)
-                        if matched_group_col:
-                            if "ethnicity" in matched_group_col.lower() and "ethnicity_cleaned" in df_cleaned.columns:
-                                plot_df = df_cleaned[["ethnicity_cleaned", target_col]].dropna()
-                                plot_df.rename(columns={"ethnicity_cleaned": matched_group_col}, inplace=True)
-                            else:
-                                plot_df = df_cleaned[[matched_group_col, target_col]].dropna()
-                            if target_col in plot_df.columns:
-                                plot_df[target_col] = pd.to_numeric(plot_df[target_col], errors="coerce")
-                            else:
-                                st.warning(f"Column '{target_col}' not found in the data.")
-                            group_avg = plot_df.groupby(matched_group_col)[target_col].agg(['mean', 'count']).reset_index()
-                            group_avg.columns = [matched_group_col, 'AvgScore', 'Count']
-                            with col_slots[chart_index % 2]:
-                                fig = px.bar(
-                                    group_avg,
-                                    x=matched_group_col,
-                                    y="AvgScore",
-                                    text="Count",
-                                    title=f"{selected_area} by {label}",
-                                    labels={matched_group_col: label, "AvgScore": "Avg Score"},
-                                    height=400,
-                                    color=matched_group_col,
-                                    color_discrete_sequence=px.colors.qualitative.Set3
-                                )
-                                fig.update_traces(
-                                    texttemplate='N=%{text}',
-                                    textposition='inside',
-                                    insidetextanchor='middle',
-                                    hovertemplate="%{x}<br>Avg Score: %{y:.2f}<br>Students: %{text}<extra></extra>"
-                                )
-                                for i, row in group_avg.iterrows():
-                                    fig.add_annotation(
-                                        x=row[matched_group_col],
-                                        y=row["AvgScore"],
-                                        text=f"Avg={row['AvgScore']:.2f}",
-                                        showarrow=False,
-                                        yshift=10,
-                                        font=dict(color='white'),
-                                        bgcolor='rgba(0,0,0,0.5)'
-                                    )
-                                max_y = group_avg["AvgScore"].max()
-                                fig.update_layout(
-                                    margin=dict(t=50),
-                                    yaxis=dict(range=[0, max_y + 0.5])
-                                )
-                                config = {
-                                    'displayModeBar': True,
-                                    'modeBarButtonsToRemove': [
-                                    'pan2d', 'select2d', 'lasso2d', 'zoom2d', 'autoScale2d', 'hoverClosestCartesian',
-                                    'hoverCompareCartesian', 'toggleSpikelines', 'zoomInGeo', 'zoomOutGeo',
-                                    'resetGeo', 'hoverClosestGeo', 'sendDataToCloud', 'toggleHover', 'drawline',
-                                    'drawopenpath', 'drawclosedpath', 'drawcircle', 'drawrect', 'eraseshape'
-                                    ],
-                                    'modeBarButtonsToAdd': ['zoomIn2d', 'zoomOut2d', 'resetScale2d', 'toImage', 'toggleFullscreen'],
-                                    #'modeBarButtonsToAdd': ['zoom2d', 'autoScale2d', 'resetScale2d', 'toImage'],
-                                    'toImageButtonOptions': {
-                                        'format': 'png',
-                                        'filename': 'Bar_chart_screenshot',
-                                        'height': 500,
-                                        'width': 700
-                                    },
-                                    'displaylogo': False
-                                }
-                                st.plotly_chart(fig, use_container_width=True, config=config)
-                            chart_index += 1
-                        else:
-                            st.info(f"No data found for {label}.")
+                    # Every construct by every group is aggregated in one job, on the worker pool for large datasets
+                    area_values = {}
+                    for area, keywords in BELONGING_QUESTIONS.items():
+                        area_col = next((col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in keywords)), None)
+                        if area_col:
+                            area_values[area] = pd.to_numeric(df_cleaned[area_col], errors="coerce").to_numpy(dtype=np.float64)
+                    target_values = area_values[selected_area]
+                    group_job_key = (
+                        "groups", analysis_fingerprint, tuple((area, tuple(keywords)) for area, keywords in BELONGING_QUESTIONS.items()),
+                        filter_key
+                    )
+                    group_aggregates, group_job = cached_job_result(
+                        group_job_key, "group_aggregation", aggregate_all_groups, area_values, demographic_index, filter_mask,
+                        rows=len(df_cleaned), inline=len(df_cleaned) < BACKGROUND_MIN_ROWS
+                    )
+                    if group_aggregates is not None:
+                        with perf_stage("group_charts", rows=len(df_cleaned)):
+                            for label in group_columns:
+                                entry = demographic_index.get(label)
+                                # Only multi-file zips have a Source File column; single files shouldn't list it as missing
+                                if entry is None and label == "Source File":
+                                    continue
+                                if entry:
+                                    matched_group_col = entry["column"]
+                                    group_avg = group_aggregates[(selected_area, label)]
+                                    with col_slots[chart_index % 2]:
+                                        fig = px.bar(
+                                            group_avg,
+                                            x=matched_group_col,
+                                            y="AvgScore",
+                                            text="Count",
+                                            title=f"{selected_area} by {label}{provisional_label}",
+                                            labels={matched_group_col: label, "AvgScore": "Avg Score"},
+                                            height=400,
+                                            color=matched_group_col,
+                                            color_discrete_sequence=px.colors.qualitative.Set3
+                                        )
+                                        fig.update_traces(
+                                            texttemplate='N=%{text}',
+                                            textposition='inside',
+                                            insidetextanchor='middle',
+                                            hovertemplate="%{x}<br>Avg Score: %{y:.2f}<br>Students: %{text}<extra></extra>"
+                                        )
+                                        for i, row in group_avg.iterrows():
+                                            fig.add_annotation(
+                                                x=row[matched_group_col],
+                                                y=row["AvgScore"],
+                                                text=f"Avg={row['AvgScore']:.2f}",
+                                                showarrow=False,
+                                                yshift=10,
+                                                font=dict(color='white'),
+                                                bgcolor='rgba(0,0,0,0.5)'
+                                            )
+                                        max_y = group_avg["AvgScore"].max()
+                                        fig.update_layout(
+                                            margin=dict(t=50),
+                                            yaxis=dict(range=[0, max_y + 0.5])
+                                        )
+                                        config = {
+                                            'displayModeBar': True,
+                                            'modeBarButtonsToRemove': [
+                                            'pan2d', 'select2d', 'lasso2d', 'zoom2d', 'autoScale2d', 'hoverClosestCartesian',
+                                            'hoverCompareCartesian', 'toggleSpikelines', 'zoomInGeo', 'zoomOutGeo',
+                                            'resetGeo', 'hoverClosestGeo', 'sendDataToCloud', 'toggleHover', 'drawline',
+                                            'drawopenpath', 'drawclosedpath', 'drawcircle', 'drawrect', 'eraseshape'
+                                            ],
+                                            'modeBarButtonsToAdd': ['zoomIn2d', 'zoomOut2d', 'resetScale2d', 'toImage', 'toggleFullscreen'],
+                                            #'modeBarButtonsToAdd': ['zoom2d', 'autoScale2d', 'resetScale2d', 'toImage'],
+                                            'toImageButtonOptions': {
+                                                'format': 'png',
+                                                'filename': 'Bar_chart_screenshot',
+                                                'height': 500,
+                                                'width': 700
+                                            },
+                                            'displaylogo': False
+                                        }
+                                        st.plotly_chart(fig, use_container_width=True, config=config)
+                                        report_figures.append((f"{selected_area} Across Groups", 2, fig.to_json()))
+                                    chart_index += 1
+                                else:
+                                    st.info(f"No data found for {label}.")
+                    elif group_job is None:
+                        st.warning(f"You already have {MAX_JOBS_PER_SESSION} background jobs running. Please wait or cancel one.")
+                    elif not group_job.done:
+                        show_job_progress(group_job, "Aggregating groups")
+                    elif group_job.status == "cancelled":
+                        st.info("Group aggregation was cancelled.")
+                        if st.button("Restart aggregation", key="restart_groups"):
+                            get_or_submit_job(
+                                group_job_key, "group_aggregation", aggregate_all_groups, area_values, demographic_index, filter_mask,
+                                rows=len(df_cleaned), restart=True
+                            )
+                            st.rerun()
+                    else:
+                        st.error(f"Group aggregation failed: {group_job.error}")
 
                 # 🎯 Breakdown by Group (Percentage)
             st.markdown("### Breakdown by Group (Percentage)")
             show_breakdown = st.toggle("Show Chart", value=True, key="toggle_breakdown")
             if show_breakdown:
-                breakdown_col = next((col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in group_columns["Gender"])), None)
-                if breakdown_col and target_col:
-                    breakdown_df = df_cleaned[[breakdown_col, target_col]].dropna()
-                    breakdown_df[target_col] = pd.to_numeric(breakdown_df[target_col], errors="coerce")
-                    if not breakdown_df.empty:
-                        def label_bucket(val):
-                            if pd.isna(val):
-                                return "Unknown"
-                            if val <= 2:
-                                return "Disagree"
-                            elif val == 3:
-                                return "Neutral"
-                            elif val >= 4:
-                                return "Agree"
-                            return "Unknown"
-                        breakdown_df["ResponseLevel"] = breakdown_df[target_col].apply(label_bucket)
-                        percent_df = breakdown_df.groupby([breakdown_col, "ResponseLevel"]).size().reset_index(name='Count')
+                gender_entry = demographic_index.get("Gender")
+                if gender_entry and target_col:
+                    breakdown_col = gender_entry["column"]
+                    # Bucket each response, then count (group, level) pairs in one bincount over the filtered rows
+                    response_levels = np.array(["Disagree", "Neutral", "Agree", "Unknown"], dtype=object)
+                    level_codes = np.select([target_values <= 2, target_values == 3, target_values >= 4], [0, 1, 2], default=3)
+                    valid = filter_mask & (gender_entry["codes"] >= 0) & ~np.isnan(target_values)
+                    pair_counts = np.bincount(
+                        gender_entry["codes"][valid] * 4 + level_codes[valid],
+                        minlength=len(gender_entry["values"]) * 4
+                    ).reshape(-1, 4)
+                    group_pos, level_pos = np.nonzero(pair_counts)
+                    percent_df = pd.DataFrame({
+                        breakdown_col: np.asarray(gender_entry["values"], dtype=object)[group_pos],
+                        "ResponseLevel": response_levels[level_pos],
+                        "Count": pair_counts[group_pos, level_pos]
+                    })
+                    if not percent_df.empty:
                         total_counts = percent_df.groupby(breakdown_col)['Count'].transform('sum')
                         percent_df['Percent'] = (percent_df['Count'] / total_counts * 100).round(1)
                         response_order = ["Agree", "Neutral", "Disagree", "Unknown"]
@@ -939,7 +2595,7 @@ if uploaded_file is not None:
                             color="ResponseLevel",
                             text=percent_df["Percent"].astype(str) + '%',
                             barmode="stack",
-                            title=f"Percentage Breakdown of Responses to '{selected_area}' by Gender",
+                            title=f"Percentage Breakdown of Responses to '{selected_area}' by Gender{provisional_label}",
                             color_discrete_map={
                                 "Agree": "#4CAF50",
                                 "Neutral": "#FFC107",
@@ -982,9 +2638,15 @@ if uploaded_file is not None:
 
 
                         st.plotly_chart(fig, use_container_width=True, config=config)
+                        report_figures.append(("Breakdown by Group", 1, fig.to_json()))
 
             # Take Action
             school_name = st.text_input("Enter your School Name", value="ABC High School", key="school_input")
+            include_charts = st.checkbox(
+                "Include charts", value=CHART_EXPORT_AVAILABLE, disabled=not CHART_EXPORT_AVAILABLE, key="report_include_charts"
+            )
+            if not CHART_EXPORT_AVAILABLE:
+                st.caption("Install the kaleido package to add charts to the report.")
             generate_pdf = st.button("Generate Report", key="generate_report_button")
 
             logo_path = "images/project_apnapan_logo.png"
@@ -1019,30 +2681,128 @@ if uploaded_file is not None:
                     self.set_font("Arial", "", 12)
                     self.set_text_color(0)
                     self.multi_cell(0, 8, f"This report presents a snapshot of how students experience Belonging, "
-                                        f"Safety, Respect, and Welcome at {school_name}. The results are based on "
+                                        f"Safety, Respect, Welcome, Participation, Acknowledgement and Relationships "
+                                        f"with Teachers at {school_name}. The results are based on "
                                         f"student-reported data collected from the survey file.")
                     self.ln(8)
 
+                def section_title(self, title):
+                    self.set_font("Arial", "B", 14)
+                    self.set_text_color(0, 51, 102)
+                    self.cell(0, 10, title, ln=True)
+                    self.ln(2)
+
+                def chart_grid(self, image_paths, per_row):
+                    width = (self.w - self.l_margin - self.r_margin) / per_row
+                    height = width * CHART_IMAGE_HEIGHT / CHART_IMAGE_WIDTH
+                    for start in range(0, len(image_paths), per_row):
+                        if self.get_y() + height > self.page_break_trigger:
+                            self.add_page()
+                        y = self.get_y()
+                        for offset, path in enumerate(image_paths[start:start + per_row]):
+                            self.image(path, x=self.l_margin + offset * width, y=y, w=width, h=height)
+                        self.set_y(y + height + 4)
+
+            # Rendering runs on the worker pool; the download button appears once the job has finished
+            def render_pdf_report(job, overall_score, averages, figures):
+                chart_paths = rasterize_figures(job, [fig_json for _, _, fig_json in figures], (0.05, 0.8))
+                pdf = ProStyledPDF()
+                pdf.add_page()
+                pdf.intro_section()
+                pdf.metric_card("Overall Belonging Score", overall_score or 0, (0, 102, 204))  # Blue
+                pdf.metric_card("Safety", averages.get("Safety", 0), (0, 153, 0))               # Green
+                pdf.metric_card("Respect", averages.get("Respect", 0), (255, 153, 51))          # Orange
+                pdf.metric_card("Welcomed", averages.get("Welcome", 0), (204, 0, 102))          # Pink
+                pdf.metric_card("Participation", averages.get("Participation", 0), (102, 51, 153))        # Purple
+                pdf.metric_card("Acknowledgement", averages.get("Acknowledgement", 0), (0, 128, 128))     # Teal
+                pdf.metric_card("Relationships with Teachers", averages.get("Relationships with Teachers", 0), (153, 102, 51))  # Brown
+                sections = OrderedDict()
+                for (section, per_row, _), path in zip(figures, chart_paths):
+                    sections.setdefault((section, per_row), []).append(path)
+                for (section, per_row), paths in sections.items():
+                    pdf.add_page()
+                    pdf.section_title(section)
+                    pdf.chart_grid(paths, per_row)
+                job.report(0.9)
+                return pdf.output(dest='S').encode('latin-1')
+
             if generate_pdf and school_name.strip():
-                if overall_belonging_score is None or not category_averages:
+                if provisional:
+                    st.warning("The report will be available once the full dataset has been processed.")
+                elif overall_belonging_score is None or not category_averages:
                     st.error("Cannot generate PDF: No valid data available. Please upload a file and process it.")
                 else:
-                    pdf = ProStyledPDF()
-                    pdf.add_page()
-                    pdf.intro_section()
-                    pdf.metric_card("Overall Belonging Score", overall_belonging_score or 0, (0, 102, 204))  # Blue
-                    pdf.metric_card("Safety", category_averages.get("Safety", 0), (0, 153, 0))               # Green
-                    pdf.metric_card("Respect", category_averages.get("Respect", 0), (255, 153, 51))          # Orange
-                    pdf.metric_card("Welcomed", category_averages.get("Welcome", 0), (204, 0, 102))          # Pink
                     clean_name = re.sub(r'[^\w\s-]', '', school_name).strip().replace(' ', '_')
                     safe_filename = f"{clean_name}_insights_report.pdf"
-                    pdf_output = pdf.output(dest='S').encode('latin-1')
+                    # Charts are identified by fingerprint: renaming the school reuses every rendered image
+                    figures = report_figures if include_charts and CHART_EXPORT_AVAILABLE else []
+                    report_options = (include_charts, tuple(figure_fingerprint(fig_json) for _, _, fig_json in figures))
+                    pdf_job_key = (
+                        "pdf", dataset_fingerprint, school_name, report_options,
+                        overall_belonging_score, tuple(category_averages.items())
+                    )
+                    previous_job = get_job(pdf_job_key)
+                    pdf_job = get_or_submit_job(
+                        pdf_job_key, "pdf_output", render_pdf_report, overall_belonging_score, dict(category_averages),
+                        figures,
+                        rows=len(df_cleaned), restart=previous_job is not None and previous_job.status != "done"
+                    )
+                    if pdf_job is None:
+                        st.warning(f"You already have {MAX_JOBS_PER_SESSION} background jobs running. Please wait or cancel one.")
+                    else:
+                        st.session_state['pdf_request'] = {"key": pdf_job_key, "file_name": safe_filename}
+
+            pdf_request = st.session_state.get('pdf_request')
+            pdf_job = get_job(pdf_request["key"]) if pdf_request and pdf_request["key"][1] == dataset_fingerprint else None
+            if pdf_job is not None:
+                if not pdf_job.done:
+                    show_job_progress(pdf_job, "Generating report")
+                elif pdf_job.status == "done":
                     st.download_button(
                         label="Downloading Report",
-                        data=pdf_output,
-                        file_name=safe_filename,
+                        data=pdf_job.result,
+                        file_name=pdf_request["file_name"],
                         mime="application/pdf"
                     )
+                elif pdf_job.status == "failed":
+                    st.error(f"Report generation failed: {pdf_job.error}")
+                else:
+                    st.info("Report generation was cancelled.")
+
+            # Interactive HTML for staff without the app, assembled from the figures already built above
+            export_html = st.button("Export Interactive HTML", key="export_html_button")
+            if export_html and school_name.strip():
+                if provisional:
+                    st.warning("The export will be available once the full dataset has been processed.")
+                elif overall_belonging_score is None or not category_averages:
+                    st.error("Cannot export: No valid data available. Please upload a file and process it.")
+                else:
+                    clean_name = re.sub(r'[^\w\s-]', '', school_name).strip().replace(' ', '_')
+                    html_key = (
+                        "html", dataset_fingerprint, school_name, overall_belonging_score, tuple(category_averages.items()),
+                        tuple(figure_fingerprint(fig_json) for _, _, fig_json in report_figures)
+                    )
+                    with perf_stage("html_export", rows=len(df_cleaned)):
+                        dataset_cache().get_or_compute(
+                            html_key, session_id,
+                            lambda: build_html_report(
+                                school_name, overall_belonging_score, category_averages, report_figures
+                            ).encode("utf-8")
+                        )
+                    st.session_state['html_request'] = {"key": html_key, "file_name": f"{clean_name}_insights_report.html"}
+
+            html_request = st.session_state.get('html_request')
+            html_report = None
+            if html_request and html_request["key"][1] == dataset_fingerprint:
+                html_report = dataset_cache().get(html_request["key"], session_id)
+            if html_report is not None:
+                st.download_button(
+                    label="Download Interactive HTML",
+                    data=html_report,
+                    file_name=html_request["file_name"],
+                    mime="text/html",
+                    key="download_html_report"
+                )
 
         # Feedback Loop
         def send_feedback_to_google_sheet(feedback_text):
@@ -1057,6 +2817,150 @@ if uploaded_file is not None:
                 st.error(f"Failed to send feedback: {e}")
                 return False
 
+    # Construct and group averages over the survey window, bucketed by day, week or longer
+    with st.expander("Trends Over Time"):
+        if submission_times is None:
+            st.write("No submission timestamps found in this file.")
+        else:
+            trend_matched = {
+                cat: [col for col in df_cleaned.columns if any(k.lower() in col.lower() for k in keywords)]
+                for cat, keywords in BELONGING_QUESTIONS.items()
+            }
+            trend_cols = [col for cols in trend_matched.values() for col in cols]
+            if not trend_cols:
+                st.info("No survey columns matched the keyword categories to calculate trends.")
+            else:
+                window_days = st.select_slider(
+                    "Bucket size", options=TREND_WINDOWS, value=1, key="trend_window",
+                    format_func=lambda days: {1: "Day", 7: "Week"}.get(days, f"{days} days")
+                )
+                trend_split = st.selectbox("Split by group", ["None", *demographic_index], key="trend_split")
+                with perf_stage("trends", rows=int(filter_mask.sum())):
+                    # Same key as the dashboard, so the item arrays are shared
+                    trend_item_key = ("items", analysis_fingerprint, tuple(dict.fromkeys(trend_cols)), tuple(trend_cols))
+                    trend_items = dataset_cache().get_or_compute(
+                        trend_item_key, session_id, lambda: build_item_arrays(df_cleaned, trend_item_key[2], trend_item_key[3])
+                    )
+                    day_index = dataset_cache().get_or_compute(
+                        ("submission_days", dataset_fingerprint), session_id,
+                        lambda: submission_day_codes(submission_times[df_cleaned.index.to_numpy()])
+                    )
+                    split_entry = demographic_index.get(trend_split)
+                    # Per-day sums do not depend on the window, so the slider only re-buckets the cumulative sums
+                    cumulative = dataset_cache().get_or_compute(
+                        ("trend_sums", trend_item_key, filter_key, trend_split), session_id,
+                        lambda: cumulative_day_sums(
+                            day_index,
+                            np.column_stack([trend_items["score"], trend_items["values"]]),
+                            filter_mask,
+                            split_entry["codes"] if split_entry else None,
+                            len(split_entry["values"]) if split_entry else 1
+                        )
+                    )
+                    starts, sums, counts = bucket_day_sums(cumulative, day_index["day_offsets"], window_days)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        means = sums / counts
+                    position = {col: i + 1 for i, col in enumerate(trend_items["columns"])}  # column 0 is the overall score
+                    series = {"Overall Belonging": means[:, :, 0]}
+                    for cat, cols in trend_matched.items():
+                        if cols:
+                            with warnings.catch_warnings():
+                                warnings.simplefilter("ignore", category=RuntimeWarning)  # buckets without answers
+                                series[cat] = np.nanmean(means[:, :, [position[col] for col in cols]], axis=2)
+                    bucket_dates = pd.to_datetime(day_index["first_day"] + starts.astype("timedelta64[D]"))
+                    students = counts[:, :, 0]
+
+                if trend_split == "None":
+                    trend_df = pd.DataFrame({
+                        "Date": np.tile(bucket_dates, len(series)),
+                        "Construct": np.repeat(list(series), len(bucket_dates)),
+                        "Average": np.concatenate([values[:, 0] for values in series.values()]),
+                        "Students": np.tile(students[:, 0], len(series)),
+                    })
+                    color_col = "Construct"
+                    title = f"Belonging over time{provisional_label}"
+                else:
+                    trend_construct = st.selectbox("Construct", list(series), key="trend_construct")
+                    group_names = [str(value) for value in split_entry["values"]]
+                    trend_df = pd.DataFrame({
+                        "Date": np.repeat(bucket_dates, len(group_names)),
+                        trend_split: np.tile(group_names, len(bucket_dates)),
+                        "Average": series[trend_construct].ravel(),
+                        "Students": students.ravel(),
+                    })
+                    color_col = trend_split
+                    title = f"{trend_construct} over time by {trend_split}{provisional_label}"
+                trend_df = trend_df[trend_df["Students"] > 0]
+                if trend_df.empty:
+                    st.write("No dated answers for the current selection.")
+                else:
+                    fig = px.line(
+                        trend_df, x="Date", y="Average", color=color_col, markers=True,
+                        hover_data={"Students": True}, title=title
+                    )
+                    fig.update_layout(yaxis_title="Avg Score", xaxis_title="Submission date")
+                    st.plotly_chart(fig, use_container_width=True)
+                    st.caption(f"{int(students.sum())} dated answers in {len(bucket_dates)} buckets")
+
+    # Term and phrase frequencies for free-text answers, optionally split by a demographic group
+    with st.expander("Open-ended Responses"):
+        derived_sources = [
+            col for col in df_cleaned.columns
+            if "ethnicity" in col.lower() or "what items among these do you have at home" in col.lower()
+        ]
+        text_exclude = set(questionnaire_cols) | {entry["column"] for entry in demographic_index.values()} | set(derived_sources)
+        text_cols = dataset_cache().get_or_compute(
+            ("text_cols", dataset_fingerprint), session_id, lambda: detect_text_cols(df_cleaned, text_exclude)
+        )
+        if not text_cols:
+            st.write("No open-ended questions found in this file.")
+        else:
+            text_col = st.selectbox("Open-ended question", text_cols, key="text_column")
+            split_label = st.selectbox("Split by group", ["None", *demographic_index], key="text_split")
+            with perf_stage("text_insights", rows=int(filter_mask.sum())):
+                text_terms = dataset_cache().get_or_compute(
+                    ("text_terms", dataset_fingerprint, text_col), session_id, lambda: build_text_terms(df_cleaned[text_col])
+                )
+                if split_label == "None":
+                    occurrences, responses, totals = term_frequencies(text_terms, filter_mask)
+                else:
+                    split_entry = demographic_index[split_label]
+                    occurrences, responses, totals = term_frequencies(
+                        text_terms, filter_mask, split_entry["codes"], len(split_entry["values"])
+                    )
+                mentioned = responses.sum(axis=0)
+                top_terms = np.argsort(-mentioned, kind="stable")[:TEXT_TOP_TERMS]
+                top_terms = top_terms[mentioned[top_terms] > 0]
+
+            if not len(top_terms):
+                st.write("No answers to show for the current selection.")
+            elif split_label == "None":
+                term_df = pd.DataFrame({
+                    "Term": text_terms["terms"][top_terms],
+                    "Responses": responses[0, top_terms],
+                    "% of Responses": (responses[0, top_terms] / totals[0] * 100).round(1),
+                    "Occurrences": occurrences[0, top_terms],
+                })
+                st.caption(f"{int(totals[0])} answers")
+                fig = px.bar(
+                    term_df.iloc[::-1], x="Responses", y="Term", orientation="h",
+                    title=f"Most mentioned terms{provisional_label}", height=max(300, 28 * len(term_df))
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                st.dataframe(term_df, hide_index=True)
+            else:
+                # Share of each group's answers that mention the term
+                present_groups = np.flatnonzero(totals > 0)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    shares = responses[np.ix_(present_groups, top_terms)] / totals[present_groups, None] * 100
+                split_df = pd.DataFrame(
+                    shares.T.round(1),
+                    columns=[f"{split_entry['values'][g]} (n={int(totals[g])})" for g in present_groups]
+                )
+                split_df.insert(0, "Term", text_terms["terms"][top_terms])
+                st.caption("% of each group's answers mentioning the term")
+                st.dataframe(split_df, hide_index=True)
+
         # Feedback Section
     with st.expander("Feedback"):
         feedback = st.text_area("Flag any issues or suggestions")
@@ -1071,3 +2975,28 @@ if uploaded_file is not None:
 
     with st.expander("Need Help?"):
         st.write("Contact us at: Phone: +91 1234567890")
+
+# Admin-only performance panel
+if admin_mode:
+    with st.sidebar.expander("Performance (admin)", expanded=False):
+        perf_records = list(st.session_state['perf_records'])
+        if perf_records:
+            perf_df = pd.DataFrame(perf_records)
+            latest_run = perf_df[perf_df["run"] == perf_df["run"].max()]
+            st.write("Latest run")
+            st.dataframe(latest_run[["stage", "rows", "wall_ms", "cpu_ms", "peak_mem_mb"]], hide_index=True)
+            st.write("All recorded runs (mean per stage)")
+            st.dataframe(perf_df.groupby("stage")[["wall_ms", "cpu_ms", "peak_mem_mb"]].mean().round(2))
+            st.download_button(
+                label="📥 Download Performance Log (JSONL)",
+                data="\n".join(json.dumps(record) for record in perf_records),
+                file_name=f"perf_{st.session_state['session_id']}.jsonl",
+                mime="application/x-ndjson"
+            )
+        else:
+            st.write("No stages recorded yet.")
+        cache = dataset_cache()
+        st.write(
+            f"Shared cache: {len(cache.entries)} entries, {cache.total_bytes / 1024 ** 2:.1f} of {CACHE_MEMORY_BUDGET_MB} MB; "
+            f"this session: {cache.session_bytes(st.session_state['session_id']) / 1024 ** 2:.1f} of {SESSION_MEMORY_BUDGET_MB} MB"
+        )